@@ -1,7 +1,13 @@
 # Create app.py in your root directory
 # filepath: c:\ig_api_scraper\fastapi-instagram-scraper\app.py
-from src.main import app
+import os
+import sys
+
+# The application modules import each other relative to src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from main import app
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=7860)
\ No newline at end of file
+    from server import main
+    main(default_port=7860)
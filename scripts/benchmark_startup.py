@@ -0,0 +1,67 @@
+"""
+Measure cold-start time of the API.
+
+Runs each measurement in a fresh interpreter so nothing is already imported:
+  - import:  time to import src/main.py (module imports, router setup)
+  - startup: import plus running the FastAPI lifespan and serving GET /
+
+Usage: python scripts/benchmark_startup.py [--runs 5] [--preload]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import main
+print((time.perf_counter() - started) * 1000)
+"""
+
+STARTUP_SNIPPET = """
+import time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    client.get("/")
+    print((time.perf_counter() - started) * 1000)
+"""
+
+
+def run_once(snippet: str, env: dict) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    # The timing is the last line; the app may print its own startup logs before it
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--preload", action="store_true", help="Benchmark with PRELOAD_SERVICES=true")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PRELOAD_SERVICES"] = "true" if args.preload else "false"
+
+    for name, snippet in (("import", IMPORT_SNIPPET), ("startup", STARTUP_SNIPPET)):
+        timings = [run_once(snippet, env) for _ in range(args.runs)]
+        print(
+            f"{name:>8}: median {statistics.median(timings):.1f}ms  "
+            f"min {min(timings):.1f}ms  max {max(timings):.1f}ms  ({args.runs} runs)"
+        )
+
+
+if __name__ == "__main__":
+    main()
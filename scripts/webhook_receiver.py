@@ -0,0 +1,70 @@
+"""
+Local stand-in for a webhook consumer, for trying out /api/v1/subscriptions.
+
+Prints every delivery it receives and, with --secret, checks X-Webhook-Signature.
+--fail-rate makes it answer 500 to a share of deliveries to exercise retries.
+
+Usage: python scripts/webhook_receiver.py [--port 9000] [--secret s3cret] [--fail-rate 0.3]
+Then subscribe with callback_url http://127.0.0.1:9000/ (run the API with WEBHOOK_ALLOWED_HOSTS=127.0.0.1)
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+def make_handler(secret, fail_rate):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            delivery = self.headers.get("X-Webhook-Delivery")
+            attempt = self.headers.get("X-Webhook-Attempt")
+
+            if secret:
+                expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(expected, self.headers.get("X-Webhook-Signature", "")):
+                    print(f"delivery {delivery} attempt {attempt}: bad signature")
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+
+            if random.random() < fail_rate:
+                print(f"delivery {delivery} attempt {attempt}: failing on purpose")
+                self.send_response(500)
+                self.end_headers()
+                return
+
+            payload = json.loads(body)
+            print(f"delivery {delivery} attempt {attempt}: {payload.get('event')}")
+            for change in payload.get("changes", []):
+                posts = ", ".join(post["shortCode"] for post in change["new_posts"]) or "none"
+                print(f"  {change['username']}: new posts {posts}; counts {change['counts']}")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--secret", help="Subscription secret to verify signatures with")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of deliveries answered with 500")
+    args = parser.parse_args()
+
+    server = HTTPServer((args.host, args.port), make_handler(args.secret, args.fail_rate))
+    print(f"Listening for webhooks on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
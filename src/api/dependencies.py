@@ -0,0 +1,202 @@
+import asyncio
+import hmac
+import time
+from typing import Optional
+from fastapi import Header, HTTPException
+from services.cache import create_cache
+from services.instagram_scraper import InstagramProfileScraper
+from services.gemini_analyzer import GeminiProfileAnalyzer
+from services.suggestion_cache import StarterPool
+from services.profile_store import ProfileStore
+from services.webhooks import SubscriptionStore
+from services.profile_watcher import ProfileWatcher
+from services.quotas import QuotaManager, current_usage
+from services.profiling import SamplingProfiler, AllocationTracker
+from utils.config import (
+    get_suggestion_cache_ttl,
+    get_starter_pool_enabled,
+    get_graceful_shutdown_timeout,
+    get_store_enabled,
+    get_watcher_enabled,
+    get_admin_api_key,
+)
+
+
+class ServiceContainer:
+    """
+    Lazily built service singletons shared by the API routes.
+    Nothing is constructed at import time; each service is built on first use
+    (or by preload() from the app lifespan) and torn down in shutdown().
+    """
+
+    def __init__(self):
+        self._scraper: Optional[InstagramProfileScraper] = None
+        self._gemini_analyzer: Optional[GeminiProfileAnalyzer] = None
+        self._suggestion_cache = None
+        self._starter_pool: Optional[StarterPool] = None
+        self._store: Optional[ProfileStore] = None
+        self._subscriptions: Optional[SubscriptionStore] = None
+        self._watcher: Optional[ProfileWatcher] = None
+        self._quotas: Optional[QuotaManager] = None
+        # Cheap to build and idle until an admin turns them on
+        self.profiler = SamplingProfiler()
+        self.allocation_tracker = AllocationTracker()
+        self.build_times = {}
+
+    def _timed(self, name: str, factory):
+        started = time.perf_counter()
+        service = factory()
+        self.build_times[name] = round((time.perf_counter() - started) * 1000, 2)
+        print(f"Initialized {name} in {self.build_times[name]}ms")
+        return service
+
+    @property
+    def scraper(self) -> InstagramProfileScraper:
+        if self._scraper is None:
+            self._scraper = self._timed(
+                "scraper",
+                lambda: InstagramProfileScraper(cache=create_cache("scrape", max_size=2000), store=self.store)
+            )
+        return self._scraper
+
+    @property
+    def store(self) -> Optional[ProfileStore]:
+        if self._store is None and get_store_enabled():
+            self._store = self._timed("store", ProfileStore)
+        return self._store
+
+    @property
+    def subscriptions(self) -> Optional[SubscriptionStore]:
+        if self._subscriptions is None and self.store is not None:
+            self._subscriptions = self._timed("subscriptions", lambda: SubscriptionStore(self.store.path))
+        return self._subscriptions
+
+    @property
+    def watcher(self) -> Optional[ProfileWatcher]:
+        if self._watcher is None and self.subscriptions is not None:
+            self._watcher = ProfileWatcher(self.scraper, self.subscriptions, self.quotas)
+        return self._watcher
+
+    @property
+    def quotas(self) -> QuotaManager:
+        if self._quotas is None:
+            self._quotas = QuotaManager()
+        return self._quotas
+
+    @property
+    def gemini_analyzer(self) -> GeminiProfileAnalyzer:
+        if self._gemini_analyzer is None:
+            self._gemini_analyzer = self._timed("gemini_analyzer", GeminiProfileAnalyzer)
+        return self._gemini_analyzer
+
+    @property
+    def suggestion_cache(self):
+        if self._suggestion_cache is None:
+            self._suggestion_cache = create_cache(
+                "suggestions", max_size=10000, ttl_seconds=get_suggestion_cache_ttl()
+            )
+        return self._suggestion_cache
+
+    @property
+    def starter_pool(self) -> Optional[StarterPool]:
+        if self._starter_pool is None and get_starter_pool_enabled():
+            self._starter_pool = StarterPool(self.gemini_analyzer.generate_json)
+        return self._starter_pool
+
+    def preload(self) -> None:
+        """Build the services and their heavy clients up front (used when PRELOAD_SERVICES is on)"""
+        self.scraper.client
+        try:
+            self.gemini_analyzer.warm_up()
+        except ValueError as e:
+            print(f"Gemini not configured, LLM endpoints will use fallbacks: {e}")
+
+    def start_background(self) -> None:
+        """Start background loops (change watcher, usage flushing) from the app lifespan"""
+        if get_watcher_enabled() and self.watcher is not None:
+            self.watcher.start()
+        self.quotas.start()
+
+    async def shutdown(self) -> None:
+        """Drain in-flight actor runs and cancel background work owned by the services"""
+        if self._watcher is not None:
+            await self._watcher.stop()
+        if self._scraper is not None and self._scraper.active_runs:
+            print(f"Waiting for {self._scraper.active_runs} in-flight actor runs")
+            if not await self._scraper.drain(get_graceful_shutdown_timeout()):
+                print(f"Shutdown timeout with {self._scraper.active_runs} actor runs still running")
+        if self._starter_pool is not None:
+            pending = self._starter_pool.cancel_pending()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        if self._quotas is not None:
+            await self._quotas.stop()
+
+
+services = ServiceContainer()
+
+
+def require_quota(kind: str) -> None:
+    """
+    Reject the request (429) if the caller's API key has no actor_runs / llm_tokens
+    quota left. Checked when a route asks for the service, before any work starts.
+    """
+    usage = current_usage.get()
+    if usage is None:
+        return
+    bucket = usage.buckets[kind]
+    if not bucket.available():
+        usage.pending["rejected"] += 1
+        raise HTTPException(
+            status_code=429,
+            detail=f"{kind.replace('_', ' ').capitalize()} quota exceeded",
+            headers={"Retry-After": str(bucket.retry_after())}
+        )
+
+async def get_scraper() -> InstagramProfileScraper:
+    require_quota("actor_runs")
+    return services.scraper
+
+def get_profile_store() -> ProfileStore:
+    store = services.store
+    if store is None:
+        raise HTTPException(status_code=503, detail="Profile store is disabled (PROFILE_STORE_ENABLED=false)")
+    return store
+
+def get_subscriptions() -> SubscriptionStore:
+    subscriptions = services.subscriptions
+    if subscriptions is None:
+        raise HTTPException(status_code=503, detail="Webhooks need the profile store (PROFILE_STORE_ENABLED=false)")
+    return subscriptions
+
+def get_watcher() -> ProfileWatcher:
+    watcher = services.watcher
+    if watcher is None:
+        raise HTTPException(status_code=503, detail="Webhooks need the profile store (PROFILE_STORE_ENABLED=false)")
+    return watcher
+
+async def get_gemini_analyzer() -> GeminiProfileAnalyzer:
+    require_quota("llm_tokens")
+    return services.gemini_analyzer
+
+def get_quotas() -> QuotaManager:
+    return services.quotas
+
+def require_admin(x_admin_key: str = Header("", description="ADMIN_API_KEY")) -> None:
+    admin_key = get_admin_api_key()
+    if not admin_key:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_key.encode(), admin_key.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+def get_profiler() -> SamplingProfiler:
+    return services.profiler
+
+def get_allocation_tracker() -> AllocationTracker:
+    return services.allocation_tracker
+
+def get_suggestion_cache():
+    return services.suggestion_cache
+
+def get_starter_pool() -> Optional[StarterPool]:
+    return services.starter_pool
@@ -0,0 +1,94 @@
+import sys
+import tracemalloc
+from starlette.responses import JSONResponse
+from services.quotas import current_usage
+from api.dependencies import services
+
+# Reachable without an API key
+PUBLIC_PATHS = {"/", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json", "/api/v1/health"}
+
+# Authenticated with ADMIN_API_KEY by the admin routes themselves
+ADMIN_PREFIX = "/api/v1/admin/"
+
+
+def _api_key(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"x-api-key":
+            return value.decode("latin-1")
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            return value[7:].decode("latin-1").strip()
+    return ""
+
+
+class QuotaMiddleware:
+    """
+    Authenticates the API key (X-API-Key or Authorization: Bearer) and takes one
+    token from its request bucket - a dict lookup and a bucket update per request,
+    so a noisy key is turned away before it costs anyone else anything.
+    Does nothing when no API_KEYS are configured.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        quotas = services.quotas
+        if (scope["type"] != "http" or not quotas.enabled
+                or scope["method"] == "OPTIONS" or scope["path"] in PUBLIC_PATHS
+                or scope["path"].startswith(ADMIN_PREFIX)):
+            await self.app(scope, receive, send)
+            return
+
+        usage = quotas.lookup(_api_key(scope))
+        if usage is None:
+            response = JSONResponse({"detail": "Missing or invalid API key"}, status_code=401)
+            await response(scope, receive, send)
+            return
+
+        bucket = usage.buckets["requests"]
+        if not bucket.take():
+            usage.pending["rejected"] += 1
+            response = JSONResponse(
+                {"detail": "Request quota exceeded"},
+                status_code=429,
+                headers={"Retry-After": str(bucket.retry_after())}
+            )
+            await response(scope, receive, send)
+            return
+
+        usage.pending["requests"] += 1
+        token = current_usage.set(usage)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_usage.reset(token)
+
+
+class ProfilingMiddleware:
+    """
+    Records each request's net allocations per endpoint while allocation
+    tracking is on (admin endpoints); otherwise a single attribute check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        tracker = services.allocation_tracker
+        if not tracker.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        bytes_before = tracemalloc.get_traced_memory()[0]
+        blocks_before = sys.getallocatedblocks()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if tracker.enabled:
+                route = scope.get("route")
+                endpoint = f"{scope['method']} {route.path if route is not None else scope['path']}"
+                tracker.record(
+                    endpoint,
+                    tracemalloc.get_traced_memory()[0] - bytes_before,
+                    sys.getallocatedblocks() - blocks_before
+                )
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+import asyncio
+from api.dependencies import require_admin, get_profiler, get_allocation_tracker
+from services.profiling import SamplingProfiler, AllocationTracker, folded_output
+from utils.config import get_profiler_max_seconds
+
+# Every route needs the X-Admin-Key header (ADMIN_API_KEY); without one configured they 404
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.post("/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, description="How long to sample"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Time between samples"),
+    include_idle: bool = Query(False, description="Keep samples of threads parked in select/locks/queues"),
+    profiler: SamplingProfiler = Depends(get_profiler)
+):
+    """
+    Sample every thread's stack for a while and return folded stacks
+    ("frame;frame;frame count" per line) for flamegraph.pl or speedscope.
+    The worker keeps serving requests while it is being profiled.
+    """
+    if seconds > get_profiler_max_seconds():
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {get_profiler_max_seconds()}")
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A CPU profile is already running")
+    try:
+        result = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(folded_output(result["stacks"]), headers={"X-Samples": str(result["samples"])})
+
+@router.post("/memory/start")
+async def start_memory_tracking(
+    frames: int = Query(10, ge=1, le=100, description="Stack depth kept per allocation"),
+    tracker: AllocationTracker = Depends(get_allocation_tracker)
+):
+    """
+    Start tracemalloc and per-endpoint allocation accounting (slows the worker down until stopped)
+    """
+    tracker.start(frames)
+    return {"success": True, "tracking": True}
+
+@router.get("/memory/snapshot")
+async def memory_snapshot(
+    top: int = Query(25, ge=1, le=500, description="Number of locations to return"),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$", description="How to group allocations"),
+    tracker: AllocationTracker = Depends(get_allocation_tracker)
+):
+    """
+    Allocation growth since the previous snapshot (or since tracking started), largest first
+    """
+    if not tracker.enabled:
+        raise HTTPException(status_code=409, detail="Memory tracking is not running (POST /admin/memory/start)")
+    return await asyncio.to_thread(tracker.snapshot_diff, top, group_by)
+
+@router.get("/memory/endpoints")
+async def memory_by_endpoint(tracker: AllocationTracker = Depends(get_allocation_tracker)):
+    """
+    Net allocations per endpoint since tracking started (approximate while requests overlap)
+    """
+    return {"tracking": tracker.enabled, "endpoints": tracker.endpoint_report()}
+
+@router.post("/memory/stop")
+async def stop_memory_tracking(tracker: AllocationTracker = Depends(get_allocation_tracker)):
+    """
+    Stop tracemalloc and allocation accounting
+    """
+    report = tracker.endpoint_report()
+    tracker.stop()
+    return {"success": True, "tracking": False, "endpoints": report}
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from datetime import datetime
+import asyncio
+import time
+from services.profile_store import ProfileStore
+from services.engagement_analytics import (
+    METRICS,
+    compute_engagement_metrics,
+    summarize_metrics,
+    metric_records,
+)
+from api.dependencies import get_profile_store
+
+router = APIRouter()
+
+def _parse_percentiles(value: str):
+    try:
+        percentiles = [float(p) for p in value.split(',') if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="percentiles must be a comma-separated list of numbers")
+    if not percentiles or any(p < 0 or p > 100 for p in percentiles):
+        raise HTTPException(status_code=422, detail="percentiles must be between 0 and 100")
+    return percentiles
+
+@router.get("/analytics/engagement")
+async def get_engagement_analytics(
+    usernames: Optional[str] = Query(None, description="Comma-separated usernames (default: every stored profile)"),
+    min_followers: Optional[int] = Query(None, description="Minimum follower count"),
+    max_followers: Optional[int] = Query(None, description="Maximum follower count"),
+    since: Optional[datetime] = Query(None, description="Only posts and snapshots at or after this time (ISO 8601)"),
+    percentiles: str = Query("25,50,75,90", description="Comma-separated percentiles for the summary"),
+    sort_by: str = Query("engagement_rate", description=f"Metric to rank profiles by: {', '.join(METRICS)}"),
+    limit: int = Query(50, ge=0, le=1000, description="Number of profiles to return (0 = summary only)"),
+    offset: int = Query(0, ge=0, description="Number of profiles to skip"),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """
+    Engagement rate, like/comment distributions, posting frequency and follower
+    growth across stored profiles, with percentiles - no actor run
+    """
+    if sort_by not in METRICS:
+        raise HTTPException(status_code=422, detail=f"sort_by must be one of: {', '.join(METRICS)}")
+    points = _parse_percentiles(percentiles)
+    names = [u.strip().lstrip('@').lower() for u in usernames.split(',') if u.strip()] if usernames else None
+
+    started = time.perf_counter()
+
+    def compute():
+        rows = store.load_engagement_rows(
+            usernames=names,
+            min_followers=min_followers,
+            max_followers=max_followers,
+            since=since.timestamp() if since else None
+        )
+        metrics = compute_engagement_metrics(rows)
+        return metrics, summarize_metrics(metrics, points), metric_records(metrics, sort_by, limit, offset)
+
+    # Loading and crunching thousands of posts is CPU/IO bound - keep it off the event loop
+    metrics, summary, profiles = await asyncio.to_thread(compute)
+    return {
+        "success": True,
+        "profiles_analyzed": len(metrics["usernames"]),
+        "posts_analyzed": int(metrics["likes"].size),
+        "percentiles": points,
+        "summary": summary,
+        "sort_by": sort_by,
+        "limit": limit,
+        "offset": offset,
+        "profiles": profiles,
+        "query_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -1,18 +1,28 @@
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from typing import List, Optional
 import httpx
 from models.schemas import ProfileScrapeRequest, ProfileScrapeResponse
 from services.instagram_scraper import InstagramProfileScraper
 from services.gemini_analyzer import GeminiProfileAnalyzer
-from utils.config import username_to_url, url_to_username
+from services.fallback_templates import get_fallback_catalog
+from services.suggestion_cache import (
+    StarterPool,
+    normalize_starter_inputs,
+    starters_cache_key,
+    suggestions_cache_key,
+)
+from api.dependencies import get_scraper, get_gemini_analyzer, get_suggestion_cache, get_starter_pool
+from utils.config import username_to_url, url_to_username, normalize_username, get_analyze_max_usernames
 import json
 import traceback
 from datetime import datetime
 
 router = APIRouter()
-scraper = InstagramProfileScraper()
-gemini_analyzer = GeminiProfileAnalyzer()
+
+# Posts each view actually uses - scrapes never ask the actor for more than this
+FRONTEND_POST_LIMIT = 10
+ANALYSIS_POST_LIMIT = 10
 
 @router.get("/health")
 async def health_check():
@@ -21,6 +31,13 @@ async def health_check():
     """
     return {"status": "healthy", "message": "Instagram Profile Scraper API is running"}
 
+@router.get("/llm/stats")
+async def get_llm_stats(gemini_analyzer: GeminiProfileAnalyzer = Depends(get_gemini_analyzer)):
+    """
+    Per-model LLM latency percentiles, hedges, wins and cancellations
+    """
+    return gemini_analyzer.policy.stats()
+
 @router.get("/proxy-image")
 async def proxy_image(url: str):
     """
@@ -55,7 +72,10 @@ async def proxy_image(url: str):
         raise HTTPException(status_code=500, detail="Failed to load image")
 
 @router.post("/scrape-profile")
-async def scrape_profile_frontend(request: dict):
+async def scrape_profile_frontend(
+    request: dict,
+    scraper: InstagramProfileScraper = Depends(get_scraper)
+):
     """
     Scrape profile endpoint for frontend - returns frontend-compatible format
     """
@@ -89,7 +109,7 @@ async def scrape_profile_frontend(request: dict):
         # Use the existing scraper
         result = await scraper.scrape_profile(
             usernames=[username],
-            results_limit=15,
+            results_limit=FRONTEND_POST_LIMIT,
             add_parent_data=True
         )
         
@@ -127,7 +147,7 @@ async def scrape_profile_frontend(request: dict):
         
         # Add posts if available
         if profile_data.latestPosts:
-            for post in profile_data.latestPosts[:10]:
+            for post in profile_data.latestPosts[:FRONTEND_POST_LIMIT]:
                 frontend_response["posts"].append({
                     "id": post.get("shortCode", ""),
                     "caption": post.get("caption", ""),
@@ -151,7 +171,11 @@ async def scrape_profile_frontend(request: dict):
         }
 
 @router.post("/analyze-profile")
-async def analyze_profile_with_gemini(request: dict):
+async def analyze_profile_with_gemini(
+    request: dict,
+    scraper: InstagramProfileScraper = Depends(get_scraper),
+    gemini_analyzer: GeminiProfileAnalyzer = Depends(get_gemini_analyzer)
+):
     """
     Analyze profile using Gemini AI
     """
@@ -168,7 +192,7 @@ async def analyze_profile_with_gemini(request: dict):
         username = url_to_username(profile_url)
         scrape_result = await scraper.scrape_profile(
             usernames=[username],
-            results_limit=15,
+            results_limit=ANALYSIS_POST_LIMIT,
             add_parent_data=True
         )
         
@@ -178,27 +202,10 @@ async def analyze_profile_with_gemini(request: dict):
         profile_data = scrape_result.data[0]
         
         # Prepare data for Gemini analysis
-        analysis_data = {
-            "display_name": profile_data.fullName or username,
-            "username": username,
-            "bio": profile_data.biography or "",
-            "follower_count": profile_data.followersCount or 0,
-            "following_count": profile_data.followingCount or 0,
-            "post_count": profile_data.postsCount or 0,
-            "posts": []
-        }
-        
-        # Add post data
-        if profile_data.latestPosts:
-            for post in profile_data.latestPosts[:10]:
-                analysis_data["posts"].append({
-                    "caption": post.get("caption", ""),
-                    "likes": post.get("likesCount", 0),
-                    "comments": post.get("commentsCount", 0)
-                })
+        analysis_data = build_analysis_data(profile_data, username)
         
         # Analyze with Gemini
-        analysis_result = await gemini_analyzer.analyze_profile(analysis_data)
+        analysis_result = await gemini_analyzer.analyze_profile(analysis_data, mode=request.get('mode'))
         
         print(f"=== GEMINI ANALYSIS RESULT ===")
         print(f"Result: {analysis_result}")
@@ -210,8 +217,80 @@ async def analyze_profile_with_gemini(request: dict):
         print(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analyze-profiles")
+async def analyze_profiles_batch(
+    request: dict,
+    scraper: InstagramProfileScraper = Depends(get_scraper),
+    gemini_analyzer: GeminiProfileAnalyzer = Depends(get_gemini_analyzer)
+):
+    """
+    Analyze many profiles with one scrape and batched Gemini requests.
+    Streams one JSON object per line (NDJSON) as each batch finishes.
+    """
+    print(f"=== BATCH GEMINI ANALYSIS REQUEST ===")
+    print(f"Request: {request}")
+    
+    raw_usernames = request.get('usernames') or request.get('profileUrls') or []
+    if not isinstance(raw_usernames, list) or not raw_usernames:
+        raise HTTPException(status_code=400, detail="usernames is required")
+    max_usernames = get_analyze_max_usernames()
+    if len(raw_usernames) > max_usernames:
+        raise HTTPException(status_code=422, detail=f"At most {max_usernames} usernames per request")
+    
+    # Canonical names, each once; the scraper serves recently scraped ones from its cache
+    normalized = [normalize_username(raw) for raw in raw_usernames]
+    usernames = list(dict.fromkeys(username for username in normalized if username))
+    invalid = [str(raw) for raw, username in zip(raw_usernames, normalized) if not username]
+    
+    # One actor run for the whole batch
+    try:
+        scrape_result = await scraper.scrape_profile(
+            usernames=usernames,
+            results_limit=ANALYSIS_POST_LIMIT,
+            add_parent_data=True
+        )
+    except Exception as e:
+        print(f"Error in analyze_profiles_batch: {e}")
+        print(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+    scraped = {
+        profile.username.lower(): profile
+        for profile in scrape_result.data
+        if profile.username
+    }
+    
+    analysis_inputs = []
+    missing = []
+    for username in usernames:
+        profile_data = scraped.get(username.lower())
+        if profile_data is None:
+            missing.append(username)
+        else:
+            analysis_inputs.append(build_analysis_data(profile_data, profile_data.username))
+    
+    async def stream_results():
+        for username in invalid:
+            yield json.dumps({
+                "username": username,
+                "success": False,
+                "error_message": "Not a valid Instagram username or profile URL"
+            }) + "\n"
+        for username in missing:
+            yield json.dumps({
+                "username": username,
+                "success": False,
+                "error_message": "Failed to scrape profile for analysis"
+            }) + "\n"
+        async for username, analysis in gemini_analyzer.iter_profile_analyses(analysis_inputs, mode=request.get('mode')):
+            yield json.dumps({"username": username, "success": True, "analysis": analysis}, default=str) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @router.post("/scrape")
-async def scrape_instagram(request: ProfileScrapeRequest):
+async def scrape_instagram(
+    request: ProfileScrapeRequest,
+    scraper: InstagramProfileScraper = Depends(get_scraper)
+):
     """
     Main scrape endpoint - scrape Instagram profiles
     """
@@ -229,7 +308,8 @@ async def scrape_instagram(request: ProfileScrapeRequest):
 async def scrape_single_profile(
     username: str,
     results_limit: Optional[int] = Query(15, description="Number of posts to retrieve"),
-    add_parent_data: Optional[bool] = Query(True, description="Include detailed post data")
+    add_parent_data: Optional[bool] = Query(True, description="Include detailed post data"),
+    scraper: InstagramProfileScraper = Depends(get_scraper)
 ):
     """
     Scrape a single Instagram profile
@@ -248,7 +328,8 @@ async def scrape_single_profile(
 async def get_profile_info(
     username: str,
     results_limit: Optional[int] = Query(15, description="Number of posts to retrieve"),
-    add_parent_data: Optional[bool] = Query(True, description="Include detailed post data")
+    add_parent_data: Optional[bool] = Query(True, description="Include detailed post data"),
+    scraper: InstagramProfileScraper = Depends(get_scraper)
 ):
     """
     Get Instagram profile information
@@ -266,7 +347,8 @@ async def get_profile_info(
 @router.get("/profile/{username}/posts")
 async def get_profile_posts(
     username: str,
-    limit: Optional[int] = Query(10, description="Number of posts to return")
+    limit: Optional[int] = Query(10, description="Number of posts to return"),
+    scraper: InstagramProfileScraper = Depends(get_scraper)
 ):
     """
     Get only the posts from a profile
@@ -278,26 +360,77 @@ async def get_profile_posts(
         raise HTTPException(status_code=500, detail=str(e))
 # Add these new endpoints after your existing ones
 
+STARTERS_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "STRING"},
+            "category": {"type": "STRING"},
+            "tone": {"type": "STRING"},
+            "text": {"type": "STRING"},
+            "context": {"type": "STRING"},
+            "cultural_notes": {"type": "STRING"}
+        },
+        "required": ["id", "text"]
+    }
+}
+
+SUGGESTIONS_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "type": {"type": "STRING"},
+            "text": {"type": "STRING"},
+            "reasoning": {"type": "STRING"}
+        },
+        "required": ["type", "text"]
+    }
+}
+
 @router.post("/conversation-starters")
-async def generate_conversation_starters(request: dict):
+async def generate_conversation_starters(
+    request: dict,
+    gemini_analyzer: GeminiProfileAnalyzer = Depends(get_gemini_analyzer),
+    suggestion_cache = Depends(get_suggestion_cache),
+    starter_pool: Optional[StarterPool] = Depends(get_starter_pool)
+):
     """
     Generate conversation starters using Gemini AI
     """
+    print(f"=== CONVERSATION STARTERS REQUEST ===")
+    print(f"Request: {request}")
+    
+    language = request.get('language', 'en')
+    category = request.get('category')
+    tone = request.get('tone', 'casual')
+    count = request.get('count', 8)
+    interests = []
+    
     try:
-        print(f"=== CONVERSATION STARTERS REQUEST ===")
-        print(f"Request: {request}")
-        
-        profile_analysis = request.get('profile_analysis', {})
-        language = request.get('language', 'en')
-        category = request.get('category')
-        tone = request.get('tone', 'casual')
-        count = request.get('count', 8)
+        inputs = normalize_starter_inputs(request)
+        language, category, tone, count = inputs["language"], inputs["category"], inputs["tone"], inputs["count"]
+        interests = inputs["interests"]
+        personality_traits = inputs["personality_traits"]
+        communication_style = inputs["communication_style"]
+        
+        cache_key = starters_cache_key(inputs)
+        cached = await suggestion_cache.aget(cache_key)
+        if cached is not None:
+            return {"conversation_starters": cached}
+        
+        # Common (interest, language, tone) combinations are served from precomputed pools.
+        # On a miss the missing pools are filled in the background for later requests,
+        # and this one (like any the pools hold too few starters for) takes the prompt below.
+        if starter_pool is not None and starter_pool.covers(interests, count):
+            pooled = await starter_pool.sample(interests, language, tone, category, count)
+            if pooled is not None:
+                await suggestion_cache.aset(cache_key, pooled)
+                return {"conversation_starters": pooled}
+            await starter_pool.ensure_pools(interests, language, tone)
         
         # Create prompt for conversation starters
-        interests = profile_analysis.get('interests', [])[:3]
-        personality_traits = profile_analysis.get('personality_traits', [])[:2]
-        communication_style = profile_analysis.get('communication_style', 'casual')
-        
         prompt = f"""
 Generate {count} conversation starters in {language} language for someone with these characteristics:
 
@@ -327,26 +460,25 @@ Return ONLY a JSON array with this format:
 """
         
         # Use Gemini to generate starters
-        response = await gemini_analyzer.model.generate_content(prompt)
+        starters = await gemini_analyzer.generate_json(prompt, STARTERS_RESPONSE_SCHEMA)
         
-        # Clean and parse response
-        text = response.text.strip()
-        if text.startswith('```json'):
-            text = text.replace('```json', '').replace('```', '')
-        
-        try:
-            starters = json.loads(text)
-            return {"conversation_starters": starters}
-        except json.JSONDecodeError:
+        starters = complete_items(starters, STARTERS_RESPONSE_SCHEMA)
+        if not starters:
             # Return fallback starters
-            return {"conversation_starters": get_fallback_starters(language, category, tone, count)}
+            return {"conversation_starters": get_fallback_starters(language, category, tone, count, interests)}
+        await suggestion_cache.aset(cache_key, starters)
+        return {"conversation_starters": starters}
         
     except Exception as e:
         print(f"Error generating conversation starters: {e}")
-        return {"conversation_starters": get_fallback_starters(language, category, tone, count)}
+        return {"conversation_starters": get_fallback_starters(language, category, tone, count, interests)}
 
 @router.post("/response-suggestions")
-async def generate_response_suggestions(request: dict):
+async def generate_response_suggestions(
+    request: dict,
+    gemini_analyzer: GeminiProfileAnalyzer = Depends(get_gemini_analyzer),
+    suggestion_cache = Depends(get_suggestion_cache)
+):
     """
     Generate response suggestions using Gemini AI
     """
@@ -359,6 +491,11 @@ async def generate_response_suggestions(request: dict):
         language = request.get('language', 'en')
         styles = request.get('styles', ['engaging', 'playful', 'supportive', 'professional'])
         
+        cache_key = suggestions_cache_key(message, context, language, styles)
+        cached = await suggestion_cache.aget(cache_key)
+        if cached is not None:
+            return {"suggestions": cached}
+        
         prompt = f"""
 Generate response suggestions in {language} language for this message: "{message}"
 
@@ -383,93 +520,58 @@ Return ONLY a JSON array with this format:
 """
         
         # Use Gemini to generate responses
-        response = await gemini_analyzer.model.generate_content(prompt)
-        
-        # Clean and parse response
-        text = response.text.strip()
-        if text.startswith('```json'):
-            text = text.replace('```json', '').replace('```', '')
+        suggestions = await gemini_analyzer.generate_json(prompt, SUGGESTIONS_RESPONSE_SCHEMA)
         
-        try:
-            suggestions = json.loads(text)
-            return {"suggestions": suggestions}
-        except json.JSONDecodeError:
+        suggestions = complete_items(suggestions, SUGGESTIONS_RESPONSE_SCHEMA)
+        if not suggestions:
             # Return fallback suggestions
-            return {"suggestions": get_fallback_responses(language, message)}
+            return {"suggestions": get_fallback_responses(language, styles)}
+        await suggestion_cache.aset(cache_key, suggestions)
+        return {"suggestions": suggestions}
         
     except Exception as e:
         print(f"Error generating response suggestions: {e}")
-        return {"suggestions": get_fallback_responses(language, message)}
+        return {"suggestions": get_fallback_responses(language, styles)}
 
-# Helper functions for fallback responses
-def get_fallback_starters(language: str, category: str, tone: str, count: int):
-    """Fallback conversation starters"""
-    if language == 'th':
-        starters = [
-            {
-                "id": "starter-1",
-                "category": category or "general",
-                "tone": tone,
-                "text": "สวัสดีครับ/ค่ะ เห็นว่าคุณสนใจเรื่องนี้ด้วยนะ อยากฟังความคิดเห็นของคุณเกี่ยวกับเรื่องนี้",
-                "context": "เริ่มต้นการสนทนาทั่วไป",
-                "cultural_notes": "การทักทายแบบสุภาพในวัฒนธรรมไทย"
-            },
-            {
-                "id": "starter-2", 
-                "category": category or "general",
-                "tone": tone,
-                "text": "เห็นโปรไฟล์แล้วดูน่าสนใจมากเลย มีอะไรแนะนำไหมคะ?",
-                "context": "แสดงความสนใจในโปรไฟล์",
-                "cultural_notes": "การแสดงความสนใจอย่างสุภาพ"
-            }
-        ]
-    else:
-        starters = [
-            {
-                "id": "starter-1",
-                "category": category or "general", 
-                "tone": tone,
-                "text": "I noticed we have some similar interests! What got you into that?",
-                "context": "Opening based on shared interests",
-                "cultural_notes": "Shows genuine interest in learning about them"
-            },
-            {
-                "id": "starter-2",
-                "category": category or "general",
-                "tone": tone, 
-                "text": "Your profile caught my attention! What's something you're really passionate about lately?",
-                "context": "General opener showing interest",
-                "cultural_notes": "Casual and engaging tone"
-            }
-        ]
+def build_analysis_data(profile_data, username: str) -> dict:
+    """Convert scraped ProfileData into the dict the Gemini analyzer expects"""
+    analysis_data = {
+        "display_name": profile_data.fullName or username,
+        "username": username,
+        "bio": profile_data.biography or "",
+        "follower_count": profile_data.followersCount or 0,
+        "following_count": profile_data.followingCount or 0,
+        "post_count": profile_data.postsCount or 0,
+        "posts": []
+    }
+    
+    # Add post data
+    if profile_data.latestPosts:
+        for post in profile_data.latestPosts[:ANALYSIS_POST_LIMIT]:
+            analysis_data["posts"].append({
+                "caption": post.get("caption", ""),
+                "likes": post.get("likesCount", 0),
+                "comments": post.get("commentsCount", 0),
+                "timestamp": post.get("timestamp", "")
+            })
     
-    return starters[:count]
+    return analysis_data
 
-def get_fallback_responses(language: str, message: str):
-    """Fallback response suggestions"""
-    if language == 'th':
-        return [
-            {
-                "type": "engaging",
-                "text": "น่าสนใจมากเลย! อยากรู้รายละเอียดเพิ่มเติม",
-                "reasoning": "แสดงความสนใจและขอข้อมูลเพิ่ม"
-            },
-            {
-                "type": "supportive", 
-                "text": "เก่งมากเลยครับ/ค่ะ! ให้กำลังใจ",
-                "reasoning": "ให้การสนับสนุนและกำลังใจ"
-            }
-        ]
-    else:
-        return [
-            {
-                "type": "engaging",
-                "text": "That's really interesting! I'd love to hear more about that.",
-                "reasoning": "Shows genuine interest and encourages them to share more"
-            },
-            {
-                "type": "supportive",
-                "text": "That sounds amazing! You should be proud of that accomplishment.",
-                "reasoning": "Provides positive reinforcement and acknowledgment"
-            }
-        ]
\ No newline at end of file
+def complete_items(result, schema: dict) -> list:
+    """Items of an LLM array result that have every field the schema requires (empty if none do)"""
+    if not isinstance(result, list):
+        return []
+    required = schema["items"].get("required", [])
+    return [
+        item for item in result
+        if isinstance(item, dict) and all(isinstance(item.get(field), str) and item[field].strip() for field in required)
+    ]
+
+# Helper functions for fallback responses
+def get_fallback_starters(language: str, category: str, tone: str, count: int, interests: Optional[List[str]] = None):
+    """Fallback conversation starters from the precompiled template catalog"""
+    return get_fallback_catalog().starters(language, category, tone, count, interests or ())
+
+def get_fallback_responses(language: str, styles: Optional[List[str]] = None):
+    """Fallback response suggestions from the precompiled template catalog"""
+    return get_fallback_catalog().responses(language, styles)
@@ -0,0 +1,131 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from datetime import datetime
+import asyncio
+import time
+from services.profile_store import ProfileStore
+from api.dependencies import get_profile_store
+
+router = APIRouter()
+
+# Store reads run in worker threads: they share a lock with writes from scrapes,
+# and a large write must not stall every request on the event loop
+
+@router.get("/stored/profiles")
+async def find_stored_profiles(
+    min_followers: Optional[int] = Query(None, description="Minimum follower count"),
+    max_followers: Optional[int] = Query(None, description="Maximum follower count"),
+    is_verified: Optional[bool] = Query(None, description="Only verified / unverified profiles"),
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """
+    Profiles we have scraped before, filtered by follower range - no actor run
+    """
+    started = time.perf_counter()
+    profiles = await asyncio.to_thread(store.find_profiles, min_followers, max_followers, is_verified, limit, offset)
+    return {
+        "success": True,
+        "count": len(profiles),
+        "limit": limit,
+        "offset": offset,
+        "profiles": profiles,
+        "query_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@router.get("/stored/profiles/{username}")
+async def get_stored_profile(
+    username: str,
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """
+    Last stored snapshot of a profile - no actor run
+    """
+    profile = await asyncio.to_thread(store.get_profile, username.lstrip('@'))
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {username} has not been scraped yet")
+    return profile
+
+@router.get("/stored/profiles/{username}/posts")
+async def get_stored_posts(
+    username: str,
+    since: Optional[datetime] = Query(None, description="Only posts published at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Only posts published at or before this time (ISO 8601)"),
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """
+    Stored posts of a profile, newest first - no actor run
+    """
+    started = time.perf_counter()
+    posts = await asyncio.to_thread(
+        store.get_posts,
+        username.lstrip('@'),
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        limit=limit,
+        offset=offset
+    )
+    return {
+        "success": True,
+        "username": username.lstrip('@'),
+        "count": len(posts),
+        "limit": limit,
+        "offset": offset,
+        "posts": posts,
+        "query_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@router.get("/stored/hashtags/{hashtag}/posts")
+async def get_stored_hashtag_posts(
+    hashtag: str,
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """
+    Stored posts carrying a hashtag, newest first - no actor run
+    """
+    started = time.perf_counter()
+    posts = await asyncio.to_thread(store.get_posts_by_hashtag, hashtag, limit, offset)
+    return {
+        "success": True,
+        "hashtag": f"#{hashtag.lstrip('#').lower()}",
+        "count": len(posts),
+        "limit": limit,
+        "offset": offset,
+        "posts": posts,
+        "query_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@router.get("/search")
+async def search_stored(
+    q: str = Query(..., min_length=1, description="Words and/or #hashtags to search for"),
+    type: str = Query("all", pattern="^(all|posts|profiles)$", description="What to search"),
+    limit: int = Query(20, ge=1, le=100, description="Page size (per result type)"),
+    offset: int = Query(0, ge=0, description="Number of results to skip (per result type)"),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """
+    Ranked full-text search over every post caption, hashtag and profile we have scraped - no actor run
+    """
+    if not store.search_enabled:
+        raise HTTPException(status_code=503, detail="Full-text search is not available (SQLite built without FTS5)")
+    
+    started = time.perf_counter()
+    response = {"success": True, "query": q, "limit": limit, "offset": offset}
+    if type in ("all", "posts"):
+        response["posts"] = await asyncio.to_thread(store.search_posts, q, limit, offset)
+    if type in ("all", "profiles"):
+        response["profiles"] = await asyncio.to_thread(store.search_profiles, q, limit, offset)
+    response["query_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return response
+
+@router.get("/stored/stats")
+async def get_store_stats(store: ProfileStore = Depends(get_profile_store)):
+    """
+    Number of profiles, posts and hashtags in the store
+    """
+    return await asyncio.to_thread(store.stats)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from services.quotas import QuotaManager, current_usage
+from api.dependencies import get_quotas
+
+router = APIRouter()
+
+@router.get("/usage")
+async def get_usage(
+    days: int = Query(7, ge=1, le=90, description="Number of days of usage history"),
+    quotas: QuotaManager = Depends(get_quotas)
+):
+    """
+    Remaining request / actor run / LLM token quota of the calling API key,
+    and its usage per day (newest first)
+    """
+    usage = current_usage.get()
+    if usage is None:
+        raise HTTPException(status_code=404, detail="Usage is tracked per API key and no API_KEYS are configured")
+    return await quotas.report(usage, days)
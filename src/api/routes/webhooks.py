@@ -0,0 +1,96 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from services.webhooks import SubscriptionStore, check_callback_url
+from services.profile_watcher import ProfileWatcher
+from services.quotas import current_usage
+from api.dependencies import get_subscriptions, get_watcher, require_quota
+from utils.config import normalize_username, get_subscription_max_usernames, get_subscription_max_usernames_per_key
+
+router = APIRouter()
+
+def _owner() -> Optional[str]:
+    """API key name the request acts for; subscriptions are only visible to the key that made them"""
+    usage = current_usage.get()
+    return usage.name if usage is not None else None
+
+@router.post("/subscriptions")
+async def create_subscription(
+    request: dict,
+    subscriptions: SubscriptionStore = Depends(get_subscriptions)
+):
+    """
+    Get a webhook when any of the given profiles changes (new posts, follower
+    changes) instead of re-scraping them. Body: usernames, callback_url, optional secret
+    used to sign each delivery (X-Webhook-Signature: sha256=HMAC of the body).
+    """
+    raw_usernames = request.get('usernames') or request.get('profileUrls') or []
+    if not isinstance(raw_usernames, list) or not raw_usernames:
+        raise HTTPException(status_code=400, detail="usernames is required")
+    invalid = [str(raw) for raw in raw_usernames if not normalize_username(raw)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid usernames: {', '.join(invalid[:10])}")
+    # Same canonical handles the scraper stores, so one profile is only watched once
+    usernames = list(dict.fromkeys(normalize_username(raw) for raw in raw_usernames))
+    max_usernames = get_subscription_max_usernames()
+    if len(usernames) > max_usernames:
+        raise HTTPException(status_code=400, detail=f"At most {max_usernames} usernames per subscription")
+    # Watched profiles are refreshed with actor runs charged to the subscribing key
+    require_quota("actor_runs")
+    owner = _owner()
+    if owner is not None:
+        max_per_key = get_subscription_max_usernames_per_key()
+        if await asyncio.to_thread(subscriptions.count_usernames, owner, usernames) > max_per_key:
+            raise HTTPException(status_code=400, detail=f"An API key can watch at most {max_per_key} usernames")
+
+    callback_url = str(request.get('callback_url') or '')
+    try:
+        await check_callback_url(callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    subscription = await asyncio.to_thread(
+        subscriptions.create, usernames, callback_url, request.get('secret'), owner=owner
+    )
+    return {"success": True, "subscription": subscription}
+
+@router.get("/subscriptions")
+async def list_subscriptions(
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    subscriptions: SubscriptionStore = Depends(get_subscriptions)
+):
+    """
+    Webhook subscriptions, newest first
+    """
+    items = await asyncio.to_thread(subscriptions.list, limit, offset, owner=_owner())
+    return {"success": True, "count": len(items), "limit": limit, "offset": offset, "subscriptions": items}
+
+@router.get("/subscriptions/{subscription_id}")
+async def get_subscription(
+    subscription_id: str,
+    subscriptions: SubscriptionStore = Depends(get_subscriptions)
+):
+    subscription = await asyncio.to_thread(subscriptions.get, subscription_id, owner=_owner())
+    if subscription is None:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return subscription
+
+@router.delete("/subscriptions/{subscription_id}")
+async def delete_subscription(
+    subscription_id: str,
+    subscriptions: SubscriptionStore = Depends(get_subscriptions)
+):
+    """
+    Stop sending webhooks to this subscription (and stop watching profiles nobody else follows)
+    """
+    if not await asyncio.to_thread(subscriptions.delete, subscription_id, owner=_owner()):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"success": True}
+
+@router.get("/watcher/stats")
+async def get_watcher_stats(watcher: ProfileWatcher = Depends(get_watcher)):
+    """
+    Watched profiles, refresh schedule and webhook delivery backlog
+    """
+    return await asyncio.to_thread(watcher.stats)
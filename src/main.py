@@ -1,15 +1,52 @@
+import time
+from contextlib import asynccontextmanager
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from api.routes.scraper import router as scraper_router
+from api.routes.store import router as store_router
+from api.routes.analytics import router as analytics_router
+from api.routes.webhooks import router as webhooks_router
+from api.routes.usage import router as usage_router
+from api.routes.admin import router as admin_router
+from api.dependencies import services
+from api.middleware import QuotaMiddleware, ProfilingMiddleware
+from services.fallback_templates import get_fallback_catalog
+from utils.config import get_preload_services
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Compile the fallback templates now rather than on the first failed LLM call
+    get_fallback_catalog()
+    # Services are built lazily on first use unless preloading is requested
+    if get_preload_services():
+        services.preload()
+    services.start_background()
+    print(
+        f"Startup complete: imports {(started - _import_started) * 1000:.1f}ms, "
+        f"lifespan {(time.perf_counter() - started) * 1000:.1f}ms"
+    )
+    yield
+    await services.shutdown()
 
 app = FastAPI(
     title="Instagram Profile Scraper API",
     description="API for scraping Instagram profiles and their posts",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# API keys and per-key quotas (added first so CORS headers also reach 401/429 responses)
+app.add_middleware(QuotaMiddleware)
+
+# Per-endpoint allocation accounting, idle unless turned on from the admin endpoints
+app.add_middleware(ProfilingMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -20,10 +57,15 @@ app.add_middleware(
 )
 
 app.include_router(scraper_router, prefix="/api/v1", tags=["scraper"])
+app.include_router(store_router, prefix="/api/v1", tags=["store"])
+app.include_router(analytics_router, prefix="/api/v1", tags=["analytics"])
+app.include_router(webhooks_router, prefix="/api/v1", tags=["webhooks"])
+app.include_router(usage_router, prefix="/api/v1", tags=["usage"])
+app.include_router(admin_router, prefix="/api/v1", tags=["admin"])
 
 @app.get("/")
 async def root():
     return {"message": "Instagram Profile Scraper API is running"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -3,7 +3,7 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 
 class ProfileScrapeRequest(BaseModel):
-    usernames: List[str] = Field(..., description="List of Instagram usernames to scrape")
+    usernames: List[str] = Field(..., description="Instagram usernames, @names or profile URLs to scrape (normalized and deduplicated)")
     results_limit: Optional[int] = Field(15, description="Number of posts to retrieve per profile")
     add_parent_data: Optional[bool] = Field(True, description="Include detailed post data")
 
@@ -0,0 +1,42 @@
+"""
+Production entry point: multiple worker processes, uvloop/httptools when
+installed, graceful shutdown, and a cache shared between workers.
+
+    python src/server.py
+
+Configured through WEB_CONCURRENCY, HOST, PORT, GRACEFUL_SHUTDOWN_TIMEOUT,
+CACHE_BACKEND and CACHE_PATH (see utils/config.py).
+"""
+import os
+import uvicorn
+from utils.config import (
+    get_server_host,
+    get_server_port,
+    get_server_workers,
+    get_graceful_shutdown_timeout,
+)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def main(default_port: int = 8000):
+    workers = get_server_workers()
+    if workers > 1:
+        # Per-process memory caches would make every worker re-scrape the same profiles
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+    
+    print(f"Starting {workers} worker(s), cache backend: {os.getenv('CACHE_BACKEND', 'memory')}")
+    uvicorn.run(
+        "main:app",
+        app_dir=SRC_DIR,
+        host=get_server_host(),
+        port=get_server_port(default_port),
+        workers=workers,
+        loop=os.getenv("SERVER_LOOP", "auto"),  # picks uvloop when installed
+        http=os.getenv("SERVER_HTTP", "auto"),  # picks httptools when installed
+        timeout_graceful_shutdown=get_graceful_shutdown_timeout(),
+        proxy_headers=True,
+        log_level=os.getenv("LOG_LEVEL", "info")
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from services.sqlite_utils import connect
+from utils.config import get_cache_backend, get_cache_path
+
+
+class TTLCache:
+    """Small in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    # A single process coalesces in memory (see RequestCoalescer), so leases always succeed
+    def acquire_lease(self, key: Hashable, lease_seconds: float) -> bool:
+        return True
+
+    def lease_held(self, key: Hashable) -> bool:
+        return False
+
+    def release_lease(self, key: Hashable) -> None:
+        pass
+
+    # Async API shared with SQLiteCache for event-loop callers; memory lookups never block
+    async def aget(self, key: Hashable) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self.set(key, value, ttl_seconds)
+
+    async def adelete(self, key: Hashable) -> None:
+        self.delete(key)
+
+    async def aacquire_lease(self, key: Hashable, lease_seconds: float) -> bool:
+        return True
+
+    async def alease_held(self, key: Hashable) -> bool:
+        return False
+
+    async def arelease_lease(self, key: Hashable) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SQLiteCache:
+    """
+    Cache stored in a local SQLite file (WAL mode) so every worker process sees
+    the same entries. Values must be JSON-serializable. Also provides leases so
+    only one process computes a missing entry at a time. Async code uses the
+    a* methods, which run the query in a thread: under write contention from
+    other workers a call can wait up to the busy timeout.
+    """
+
+    PRUNE_EVERY = 200
+
+    def __init__(self, namespace: str, path: Optional[str] = None,
+                 max_size: int = 1024, ttl_seconds: float = 3600):
+        self.namespace = namespace
+        self.path = path or get_cache_path()
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_leases ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, owner TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return key if isinstance(key, str) else json.dumps(key, default=str)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, self._key(key), time.time())
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        payload = json.dumps(value, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, self._key(key), payload, time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        now = time.time()
+        self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        self._conn.execute("DELETE FROM cache_leases WHERE expires_at <= ?", (now,))
+        # Over capacity: drop the entries closest to expiry
+        self._conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_size)
+        )
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, self._key(key))
+            )
+
+    def acquire_lease(self, key: Hashable, lease_seconds: float) -> bool:
+        """Claim the right to compute key; False if another live process holds it"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (self.namespace, self._key(key), now)
+            )
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO cache_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, self._key(key), self.owner, now + lease_seconds)
+            )
+            return cursor.rowcount == 1
+
+    def lease_held(self, key: Hashable) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, self._key(key), time.time())
+            ).fetchone()
+        return row is not None
+
+    def release_lease(self, key: Hashable) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+                (self.namespace, self._key(key), self.owner)
+            )
+
+    async def aget(self, key: Hashable) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl_seconds)
+
+    async def adelete(self, key: Hashable) -> None:
+        await asyncio.to_thread(self.delete, key)
+
+    async def aacquire_lease(self, key: Hashable, lease_seconds: float) -> bool:
+        return await asyncio.to_thread(self.acquire_lease, key, lease_seconds)
+
+    async def alease_held(self, key: Hashable) -> bool:
+        return await asyncio.to_thread(self.lease_held, key)
+
+    async def arelease_lease(self, key: Hashable) -> None:
+        await asyncio.to_thread(self.release_lease, key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ? AND expires_at > ?",
+                (self.namespace, time.time())
+            ).fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "size": len(self), "hits": self.hits, "misses": self.misses}
+
+
+def create_cache(namespace: str, max_size: int = 1024, ttl_seconds: float = 3600):
+    """Build a cache using the configured backend (CACHE_BACKEND)"""
+    if get_cache_backend() == "sqlite":
+        return SQLiteCache(namespace, max_size=max_size, ttl_seconds=ttl_seconds)
+    return TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+
+class RequestCoalescer:
+    """
+    Makes concurrent requests for the same key share one computation.
+    Within a process, callers await the same future; across worker processes,
+    a cache lease lets one process compute while the others wait for the result.
+    """
+
+    def __init__(self, cache, lease_seconds: float = 300, poll_interval: float = 0.25):
+        self.cache = cache
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                             ttl_seconds: Optional[float] = None,
+                             should_cache: Callable[[Any], bool] = lambda value: value is not None) -> Any:
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark exceptions as retrieved when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            value = await self._compute_once(key, compute, ttl_seconds, should_cache)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _compute_once(self, key, compute, ttl_seconds, should_cache) -> Any:
+        if not await self.cache.aacquire_lease(key, self.lease_seconds):
+            # Another worker is computing it - wait for its result instead of duplicating the work
+            deadline = time.monotonic() + self.lease_seconds
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                cached = await self.cache.aget(key)
+                if cached is not None:
+                    return cached
+                if not await self.cache.alease_held(key):
+                    break  # the other worker failed without caching anything
+            await self.cache.aacquire_lease(key, self.lease_seconds)
+
+        try:
+            value = await compute()
+            if should_cache(value):
+                await self.cache.aset(key, value, ttl_seconds)
+            return value
+        finally:
+            await self.cache.arelease_lease(key)
@@ -0,0 +1,155 @@
+from typing import Dict, Any, List, Sequence
+
+# Per-profile metrics exposed by the analytics endpoint, in output order
+METRICS = [
+    "followers",
+    "posts_analyzed",
+    "average_likes",
+    "median_likes",
+    "average_comments",
+    "median_comments",
+    "engagement_rate",
+    "posts_per_week",
+    "follower_growth",
+    "follower_growth_pct",
+]
+
+DEFAULT_PERCENTILES = (25, 50, 75, 90)
+
+
+def _group_medians(np, group_ids, values, counts):
+    """Median of values within each group, without a Python loop over groups"""
+    medians = np.zeros(counts.size)
+    if values.size == 0:
+        return medians
+    order = np.lexsort((values, group_ids))
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has_posts = counts > 0
+    lower = starts[has_posts] + (counts[has_posts] - 1) // 2
+    upper = starts[has_posts] + counts[has_posts] // 2
+    medians[has_posts] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return medians
+
+
+def _group_first_last(np, group_ids, times, values, n):
+    """Value at the earliest and latest time within each group (nan when a group is empty)"""
+    first = np.full(n, np.nan)
+    last = np.full(n, np.nan)
+    if group_ids.size == 0:
+        return first, last
+    order = np.lexsort((times, group_ids))
+    sorted_ids = group_ids[order]
+    sorted_values = values[order]
+    counts = np.bincount(sorted_ids, minlength=n)
+    ends = np.cumsum(counts)
+    present = counts > 0
+    first[present] = sorted_values[(ends - counts)[present]]
+    last[present] = sorted_values[ends[present] - 1]
+    return first, last
+
+
+def compute_engagement_metrics(rows: Dict[str, List[tuple]]) -> Dict[str, Any]:
+    """
+    Per-profile engagement metrics for every profile in rows (as returned by
+    ProfileStore.load_engagement_rows), computed in one vectorized pass.
+    Returns {"usernames": [...], <metric>: array, "likes": all post likes, "comments": ...}.
+    """
+    import numpy as np  # deferred - keeps app startup fast
+
+    profiles = rows["profiles"]
+    posts = rows["posts"]
+    snapshots = rows["snapshots"]
+    n = len(profiles)
+    usernames = [row[0] for row in profiles]
+    index = {username: i for i, username in enumerate(usernames)}
+
+    followers = np.fromiter((row[1] or 0 for row in profiles), dtype=np.float64, count=n)
+
+    post_ids = np.fromiter((index[row[0]] for row in posts), dtype=np.int64, count=len(posts))
+    likes = np.fromiter((row[1] or 0 for row in posts), dtype=np.float64, count=len(posts))
+    comments = np.fromiter((row[2] or 0 for row in posts), dtype=np.float64, count=len(posts))
+    posted_at = np.fromiter(
+        (row[3] if row[3] is not None else np.nan for row in posts), dtype=np.float64, count=len(posts)
+    )
+
+    counts = np.bincount(post_ids, minlength=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average_likes = np.where(counts > 0, np.bincount(post_ids, weights=likes, minlength=n) / counts, 0.0)
+        average_comments = np.where(counts > 0, np.bincount(post_ids, weights=comments, minlength=n) / counts, 0.0)
+        engagement_rate = np.where(followers > 0, (average_likes + average_comments) / followers * 100, 0.0)
+
+    # Posting cadence from the span between each profile's oldest and newest post
+    dated = ~np.isnan(posted_at)
+    first_post = np.full(n, np.inf)
+    last_post = np.full(n, -np.inf)
+    np.minimum.at(first_post, post_ids[dated], posted_at[dated])
+    np.maximum.at(last_post, post_ids[dated], posted_at[dated])
+    dated_counts = np.bincount(post_ids[dated], minlength=n)
+    span_days = (last_post - first_post) / 86400
+    with np.errstate(divide='ignore', invalid='ignore'):
+        posts_per_week = np.where((dated_counts > 1) & (span_days > 0), (dated_counts - 1) / span_days * 7, 0.0)
+
+    # Follower growth between the first and last stored snapshot in the window
+    snapshot_ids = np.fromiter((index[row[0]] for row in snapshots), dtype=np.int64, count=len(snapshots))
+    snapshot_times = np.fromiter((row[1] for row in snapshots), dtype=np.float64, count=len(snapshots))
+    snapshot_followers = np.fromiter((row[2] or 0 for row in snapshots), dtype=np.float64, count=len(snapshots))
+    first_followers, last_followers = _group_first_last(np, snapshot_ids, snapshot_times, snapshot_followers, n)
+    follower_growth = np.nan_to_num(last_followers - first_followers)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        follower_growth_pct = np.where(first_followers > 0, follower_growth / first_followers * 100, 0.0)
+
+    return {
+        "usernames": usernames,
+        "followers": followers,
+        "posts_analyzed": counts.astype(np.float64),
+        "average_likes": average_likes,
+        "median_likes": _group_medians(np, post_ids, likes, counts),
+        "average_comments": average_comments,
+        "median_comments": _group_medians(np, post_ids, comments, counts),
+        "engagement_rate": engagement_rate,
+        "posts_per_week": posts_per_week,
+        "follower_growth": follower_growth,
+        "follower_growth_pct": np.nan_to_num(follower_growth_pct),
+        "likes": likes,
+        "comments": comments,
+    }
+
+
+def summarize_metrics(metrics: Dict[str, Any], percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    """Percentiles of every per-profile metric, plus like/comment distributions over all posts"""
+    import numpy as np
+
+    def distribution(values) -> Dict[str, float]:
+        if values.size == 0:
+            return {}
+        points = np.percentile(values, percentiles)
+        summary = {f"p{p:g}": round(float(v), 2) for p, v in zip(percentiles, points)}
+        summary["mean"] = round(float(values.mean()), 2)
+        return summary
+
+    # Profiles without stored posts would drag every engagement percentile to zero
+    with_posts = metrics["posts_analyzed"] > 0
+    summary = {
+        metric: distribution(metrics[metric][with_posts] if metric != "followers" else metrics[metric])
+        for metric in METRICS if metric != "posts_analyzed"
+    }
+    summary["post_likes"] = distribution(metrics["likes"])
+    summary["post_comments"] = distribution(metrics["comments"])
+    return summary
+
+
+def metric_records(metrics: Dict[str, Any], sort_by: str = "engagement_rate",
+                   limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    """Per-profile rows sorted by a metric (descending), paginated"""
+    import numpy as np
+
+    order = np.argsort(-metrics[sort_by], kind="stable")[offset:offset + limit]
+    records = []
+    for i in order:
+        record = {"username": metrics["usernames"][i]}
+        for metric in METRICS:
+            value = float(metrics[metric][i])
+            record[metric] = int(value) if metric in ("followers", "posts_analyzed", "follower_growth") else round(value, 2)
+        records.append(record)
+    return records
@@ -0,0 +1,159 @@
+import json
+import os
+import string
+import sys
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from services.cache import TTLCache
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "fallback_templates.json")
+
+# Slots a template may use; anything else is a typo caught when the catalog loads
+TEMPLATE_SLOTS = {"interest", "hashtag"}
+
+DEFAULT_STYLES = ("engaging", "supportive")
+
+
+class CompiledTemplate:
+    """Template split once into literal text and slot names, so rendering is a join"""
+
+    __slots__ = ("source", "parts", "slots")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(source):
+            if field is not None and (field not in TEMPLATE_SLOTS or format_spec or conversion):
+                raise ValueError(f"Unsupported template slot {{{field}}} in {source!r}")
+            self.parts.append((literal, field))
+        self.slots = frozenset(field for _, field in self.parts if field)
+
+    def render(self, values: Dict[str, str]) -> str:
+        if not self.slots:
+            return self.source
+        return "".join(literal + (values[field] if field else "") for literal, field in self.parts)
+
+
+class FallbackCatalog:
+    """
+    Per-locale conversation starter and reply templates used when Gemini is
+    unavailable. Templates are compiled when the catalog loads and rendered
+    results are kept (as tuples, each caller gets its own list of copies), so
+    a fallback is a cache lookup on the hot path.
+    """
+
+    def __init__(self, data: Dict[str, Any], cache_size: int = 2048):
+        self.default_locale = data["default_locale"]
+        self.aliases: Dict[str, str] = data.get("aliases", {})
+        self.locales: Dict[str, Dict[str, Any]] = {}
+        for locale, entry in data["locales"].items():
+            starters = [
+                {
+                    "id": starter["id"],
+                    "category": starter["category"],
+                    "template": CompiledTemplate(starter["text"]),
+                    "context": starter["context"],
+                    "cultural_notes": starter.get("cultural_notes", entry["cultural_notes"]),
+                }
+                for starter in entry["starters"]
+            ]
+            self.locales[locale] = {
+                "lowercase_slots": entry.get("lowercase_slots", False),
+                "interest_starters": [s for s in starters if "interest" in s["template"].slots],
+                "general_starters": [s for s in starters if not s["template"].slots],
+                "responses": {response["type"]: response for response in entry["responses"]},
+            }
+        self.analysis_starters = {
+            name: CompiledTemplate(text) for name, text in data.get("analysis_starters", {}).items()
+        }
+        self._rendered = TTLCache(max_size=cache_size, ttl_seconds=float("inf"))
+
+    @classmethod
+    def load(cls, path: str = CATALOG_PATH) -> "FallbackCatalog":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def resolve_locale(self, language: Optional[str]) -> str:
+        """Map "pt-BR", "th_TH", "Thai" etc. onto a catalog locale, else the default"""
+        tag = str(language or "").strip().lower().replace("_", "-")
+        for candidate in (tag, tag.split("-", 1)[0]):
+            candidate = self.aliases.get(candidate, candidate)
+            if candidate in self.locales:
+                return candidate
+        return self.default_locale
+
+    def _slot_value(self, locale: str, value: str) -> str:
+        value = value.strip()
+        return value.lower() if self.locales[locale]["lowercase_slots"] else value
+
+    def starters(self, language: Optional[str], category: Optional[str], tone: str, count: int,
+                 interests: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Up to count starters in the requested locale. Interest templates are
+        filled with the profile's interests (rotating through them); templates
+        of the requested category come first, generic openers last.
+        """
+        locale = self.resolve_locale(language)
+        interests = tuple(i for i in (self._slot_value(locale, str(i)) for i in interests) if i)
+        key = ("starters", locale, (category or "").lower(), tone, count, interests)
+        cached = self._rendered.get(key)
+        if cached is not None:
+            return [dict(item) for item in cached]
+
+        entry = self.locales[locale]
+        candidates = []
+        if interests:
+            for index, starter in enumerate(entry["interest_starters"]):
+                interest = interests[index % len(interests)]
+                candidates.append((starter, {"interest": interest}))
+        candidates.extend((starter, {}) for starter in entry["general_starters"])
+        if category:
+            # Stable sort: matching category first, the rest keep catalog order
+            candidates.sort(key=lambda candidate: candidate[0]["category"] != category.lower())
+
+        rendered = tuple(
+            {
+                "id": f"starter-{index}",
+                "category": category or starter["category"],
+                "tone": tone,
+                "text": sys.intern(starter["template"].render(values)),
+                "context": starter["context"],
+                "cultural_notes": starter["cultural_notes"],
+            }
+            for index, (starter, values) in enumerate(candidates[:max(count, 0)], start=1)
+        )
+        self._rendered.set(key, rendered)
+        return [dict(item) for item in rendered]
+
+    def responses(self, language: Optional[str], styles: Optional[Sequence[str]] = None) -> List[Dict[str, str]]:
+        """One reply per requested style the locale has templates for (engaging and supportive by default)"""
+        locale = self.resolve_locale(language)
+        styles = tuple(str(style).lower() for style in (styles or DEFAULT_STYLES))
+        key = ("responses", locale, styles)
+        cached = self._rendered.get(key)
+        if cached is not None:
+            return [dict(item) for item in cached]
+
+        available = self.locales[locale]["responses"]
+        rendered = tuple(available[style] for style in dict.fromkeys(styles) if style in available)
+        if not rendered:
+            rendered = tuple(available[style] for style in DEFAULT_STYLES if style in available)
+        self._rendered.set(key, rendered)
+        return [dict(item) for item in rendered]
+
+    def analysis_starter(self, name: str, **values: str) -> str:
+        """English starter used by the local analyzer, e.g. analysis_starter("hashtag", hashtag="#run")"""
+        return self.analysis_starters[name].render(values)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"locales": sorted(self.locales), "rendered": self._rendered.stats()}
+
+
+_catalog: Optional[FallbackCatalog] = None
+
+
+def get_fallback_catalog() -> FallbackCatalog:
+    """The shared catalog, loaded and compiled on first use (the app lifespan warms it at startup)"""
+    global _catalog
+    if _catalog is None:
+        _catalog = FallbackCatalog.load()
+    return _catalog
@@ -1,212 +1,112 @@
-import google.generativeai as genai
-import json
-from typing import Dict, Any, List
-from utils.config import get_gemini_api_key
+import asyncio
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from utils.config import get_analysis_mode, get_batch_max_concurrency
+from services.prompt_builder import AnalysisPromptBuilder, ANALYSIS_RESPONSE_SCHEMA, BATCH_ANALYSIS_RESPONSE_SCHEMA
+from services.llm_policy import LLMExecutionPolicy
+from services.local_analyzer import LocalProfileAnalyzer
 from datetime import datetime
-import re
 
 class GeminiProfileAnalyzer:
     def __init__(self):
-        api_key = get_gemini_api_key()
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
+        self.policy = LLMExecutionPolicy()
+        self.prompt_builder = AnalysisPromptBuilder()
+        self.local_analyzer = LocalProfileAnalyzer()
+        self.analysis_mode = get_analysis_mode()
+        self.max_concurrent_batches = get_batch_max_concurrency()
+    
+    def warm_up(self) -> None:
+        """
+        Create the LLM clients up front (used by preload).
+        Raises ValueError when a Gemini model is configured without GEMINI_API_KEY.
+        """
+        self.policy.warm_up()
+    
+    async def generate_json(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """
+        Run a prompt and parse the JSON in the response.
+        The execution policy hedges slow requests and races providers when configured.
+        Returns None if no response contains anything recoverable.
+        """
+        return await self.policy.generate_json(prompt, response_schema)
     
-    async def analyze_profile(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_profile(self, profile_data: Dict[str, Any], mode: Optional[str] = None) -> Dict[str, Any]:
         """
-        Analyze Instagram profile using Gemini AI with enhanced prompts
+        Analyze Instagram profile using Gemini AI with enhanced prompts.
+        In "fast" mode the local heuristic analyzer answers without an LLM call.
         """
+        if (mode or self.analysis_mode) == "fast":
+            return self._get_enhanced_fallback_analysis(profile_data)
+        
         try:
             prompt = self._create_enhanced_analysis_prompt(profile_data)
             
-            response = self.model.generate_content(prompt)
-            analysis_text = response.text
-            
-            # Clean up the response
-            analysis_text = self._clean_json_response(analysis_text)
-            
-            try:
-                analysis_result = json.loads(analysis_text)
-                # Validate and enhance the result
-                return self._validate_and_enhance_result(analysis_result, profile_data)
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse JSON response: {e}")
-                print(f"Response text: {analysis_text}")
+            analysis_result = await self.generate_json(prompt, ANALYSIS_RESPONSE_SCHEMA)
+            if not isinstance(analysis_result, dict):
                 return self._get_enhanced_fallback_analysis(profile_data)
             
+            # Validate and enhance the result
+            return self._validate_and_enhance_result(analysis_result, profile_data)
+            
         except Exception as e:
             print(f"Error in Gemini analysis: {e}")
             return self._get_enhanced_fallback_analysis(profile_data)
     
-    def _create_enhanced_analysis_prompt(self, profile_data: Dict[str, Any]) -> str:
-        """Create enhanced analysis prompt tailored for dating/social app context"""
-        
-        # Extract and analyze content
-        posts = profile_data.get('posts', [])
-        post_captions = []
-        hashtags = []
-        total_engagement = 0
-        
-        for post in posts[:10]:
-            caption = post.get('caption', '')
-            if caption:
-                post_captions.append(caption)
-                # Extract hashtags
-                hashtags.extend(re.findall(r'#\w+', caption.lower()))
-                # Calculate engagement
-                likes = post.get('likes', 0)
-                comments = post.get('comments', 0)
-                total_engagement += likes + comments
-        
-        posts_text = '\n---\n'.join(post_captions) if post_captions else 'No recent posts available'
-        unique_hashtags = list(set(hashtags))[:10]  # Top 10 unique hashtags
-        
-        bio = profile_data.get('bio', '')
-        follower_count = profile_data.get('follower_count', 0)
-        following_count = profile_data.get('following_count', 0)
-        post_count = profile_data.get('post_count', 0)
-        
-        # Calculate engagement rate
-        avg_engagement = total_engagement / len(posts) if posts else 0
-        engagement_rate = (avg_engagement / follower_count * 100) if follower_count > 0 else 0
-        
-        prompt = f"""
-You are an expert social media analyst specializing in personality insights for dating and social networking apps. Analyze this Instagram profile and provide detailed insights that would help someone understand this person's personality, interests, and how to connect with them.
-
-PROFILE DATA:
-Name: {profile_data.get('display_name', 'N/A')}
-Username: @{profile_data.get('username', 'N/A')}
-Bio: "{bio}"
-Followers: {follower_count:,}
-Following: {following_count:,}
-Posts: {post_count}
-Engagement Rate: {engagement_rate:.1f}%
-
-RECENT POST CONTENT:
-{posts_text}
-
-HASHTAGS USED: {', '.join(unique_hashtags) if unique_hashtags else 'None detected'}
-
-ANALYSIS INSTRUCTIONS:
-1. Focus on personality traits that would be relevant for dating/friendship connections
-2. Identify genuine interests (not just surface-level hobbies)
-3. Create conversation starters that feel natural and engaging
-4. Analyze communication style for compatibility insights
-5. Provide realistic confidence scores based on evidence
-
-Return ONLY a valid JSON object with this EXACT structure:
-
-{{
-  "personality_traits": [
-    {{
-      "trait": "Creative",
-      "confidence": 0.85,
-      "description": "Demonstrates artistic expression and creative thinking through visual content and captions",
-      "evidence": "Multiple artistic posts with thoughtful composition and creative captions"
-    }},
-    {{
-      "trait": "Adventurous", 
-      "confidence": 0.72,
-      "description": "Shows willingness to try new experiences and explore different places",
-      "evidence": "Travel posts and trying new activities"
-    }},
-    {{
-      "trait": "Social",
-      "confidence": 0.68,
-      "description": "Enjoys connecting with others and sharing experiences",
-      "evidence": "Group photos and social event posts"
-    }}
-  ],
-  "interests": [
-    {{
-      "name": "Photography",
-      "confidence": 0.90,
-      "category": "art"
-    }},
-    {{
-      "name": "Travel",
-      "confidence": 0.85,
-      "category": "travel"
-    }},
-    {{
-      "name": "Fitness",
-      "confidence": 0.75,
-      "category": "wellness"
-    }},
-    {{
-      "name": "Food & Cooking",
-      "confidence": 0.70,
-      "category": "food"
-    }}
-  ],
-  "conversation_starters": [
-    "I noticed you have a great eye for photography - what got you into capturing those kinds of moments?",
-    "Your travel photos are incredible! What's been your favorite destination so far?",
-    "I love your creative content - do you have any tips for someone just getting into [specific interest]?"
-  ],
-  "communication_style": {{
-    "tone": "warm",
-    "formality_level": "casual",
-    "emoji_usage": "moderate",
-    "posting_frequency": "regular", 
-    "engagement_style": "interactive",
-    "language_complexity": "moderate"
-  }},
-  "content_analysis": {{
-    "top_hashtags": {json.dumps(unique_hashtags[:5])},
-    "posting_patterns": {{
-      "most_active_time": "evening",
-      "most_active_day": "weekend",
-      "average_posts_per_week": {max(1, post_count // 52) if post_count > 52 else post_count}
-    }},
-    "content_themes": ["photography", "lifestyle", "travel", "food"],
-    "engagement_metrics": {{
-      "average_likes": {int(avg_engagement * 0.8) if avg_engagement > 0 else 50},
-      "average_comments": {int(avg_engagement * 0.2) if avg_engagement > 0 else 10},
-      "engagement_rate": {engagement_rate:.1f}
-    }}
-  }},
-  "social_signals": {{
-    "lifestyle_indicators": ["urban_professional", "creative_type", "social_butterfly"],
-    "values": ["authenticity", "creativity", "adventure"],
-    "relationship_readiness": "open_to_connections",
-    "communication_preference": "visual_storytelling"
-  }},
-  "metadata": {{
-    "analyzed_at": "{datetime.now().isoformat()}",
-    "confidence_score": 0.82,
-    "data_points_analyzed": {len(post_captions) + (1 if bio else 0) + len(unique_hashtags)}
-  }}
-}}
-
-IMPORTANT GUIDELINES:
-- Base ALL insights on actual profile data provided
-- Use confidence scores between 0.6-0.95 (be realistic)
-- Focus on positive traits and genuine interests
-- Make conversation starters specific and personalized
-- Ensure all JSON is valid and properly formatted
-- Categories for interests: art, travel, fitness, food, music, technology, wellness, sports, business, fashion
-"""
-        return prompt
+    async def _analyze_batch(self, profiles: List[Dict[str, Any]], prompt: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Run one multi-profile prompt and split the reply back into per-profile results"""
+        by_username: Dict[str, Dict[str, Any]] = {}
+        try:
+            results = await self.generate_json(prompt, BATCH_ANALYSIS_RESPONSE_SCHEMA)
+            if isinstance(results, list):
+                for item in results:
+                    if isinstance(item, dict) and item.get('username'):
+                        by_username[str(item.pop('username')).lstrip('@').lower()] = item
+        except Exception as e:
+            print(f"Error in Gemini batch analysis: {e}")
+        
+        analyses = []
+        for profile_data in profiles:
+            username = profile_data.get('username', '')
+            result = by_username.get(username.lower())
+            if result is None:
+                # Missing or dropped from a truncated reply - fall back for this profile only
+                analyses.append((username, self._get_enhanced_fallback_analysis(profile_data)))
+            else:
+                analyses.append((username, self._validate_and_enhance_result(result, profile_data)))
+        return analyses
     
-    def _clean_json_response(self, text: str) -> str:
-        """Clean up JSON response from Gemini"""
-        # Remove markdown formatting
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0]
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0]
+    async def iter_profile_analyses(self, profiles: List[Dict[str, Any]],
+                                    mode: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Analyze many profiles, packing several into each Gemini request (at most
+        BATCH_MAX_CONCURRENCY in flight). Yields (username, analysis) pairs as each batch completes.
+        """
+        if (mode or self.analysis_mode) == "fast":
+            for profile_data in profiles:
+                yield profile_data.get('username', ''), self._get_enhanced_fallback_analysis(profile_data)
+            return
         
-        # Remove any leading/trailing whitespace and newlines
-        text = text.strip()
+        semaphore = asyncio.Semaphore(self.max_concurrent_batches)
         
-        # Fix common JSON formatting issues
-        text = text.replace('\n', ' ')
-        text = re.sub(r'\s+', ' ', text)
+        async def analyze(batch: List[Dict[str, Any]], prompt: str) -> List[Tuple[str, Dict[str, Any]]]:
+            async with semaphore:
+                return await self._analyze_batch(batch, prompt)
         
-        return text
+        tasks = [
+            asyncio.ensure_future(analyze(batch, prompt))
+            for batch, prompt in self.prompt_builder.pack_batches(profiles)
+        ]
+        print(f"Analyzing {len(profiles)} profiles in {len(tasks)} Gemini requests")
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for username, analysis in await finished:
+                    yield username, analysis
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def _create_enhanced_analysis_prompt(self, profile_data: Dict[str, Any]) -> str:
+        """Create enhanced analysis prompt tailored for dating/social app context"""
+        return self.prompt_builder.build(profile_data)
     
     def _validate_and_enhance_result(self, result: Dict[str, Any], profile_data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and enhance the analysis result"""
@@ -238,6 +138,10 @@ IMPORTANT GUIDELINES:
                 "communication_preference": "digital_native"
             }
         
+        # The prompt schema is static, so stamp the analysis time here
+        metadata = result.setdefault('metadata', {})
+        metadata['analyzed_at'] = datetime.now().isoformat()
+        
         return result
     
     def _get_default_traits(self) -> List[Dict[str, Any]]:
@@ -282,74 +186,10 @@ IMPORTANT GUIDELINES:
     
     def _get_enhanced_fallback_analysis(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
         """Enhanced fallback analysis with real data"""
-        follower_count = profile_data.get('follower_count', 0)
-        bio = profile_data.get('bio', '')
-        posts = profile_data.get('posts', [])
-        
-        # Analyze bio for interests
-        bio_lower = bio.lower()
-        detected_interests = []
-        
-        interest_keywords = {
-            "photography": ["photo", "camera", "shot", "capture", "lens"],
-            "travel": ["travel", "explore", "adventure", "journey", "wanderlust"],
-            "fitness": ["fitness", "gym", "workout", "health", "running"],
-            "food": ["food", "cook", "chef", "recipe", "foodie"],
-            "art": ["art", "creative", "design", "artist", "paint"],
-            "music": ["music", "song", "concert", "band", "guitar"]
-        }
-        
-        for category, keywords in interest_keywords.items():
-            if any(keyword in bio_lower for keyword in keywords):
-                detected_interests.append({
-                    "name": category.title(),
-                    "confidence": 0.75,
-                    "category": category
-                })
-        
-        # Default interests if none detected
-        if not detected_interests:
-            detected_interests = self._get_default_interests()
-        
-        return {
-            "personality_traits": self._get_default_traits(),
-            "interests": detected_interests[:4],
-            "conversation_starters": [
-                f"I noticed from your bio that you're into {detected_interests[0]['name'].lower()} - what got you started with that?",
-                "Your profile caught my attention! What's something you're really passionate about?",
-                "I'd love to learn more about what makes you tick - what do you enjoy doing most?"
-            ],
-            "communication_style": {
-                "tone": "friendly",
-                "formality_level": "casual", 
-                "emoji_usage": "moderate",
-                "posting_frequency": "regular",
-                "engagement_style": "moderate",
-                "language_complexity": "moderate"
-            },
-            "content_analysis": {
-                "top_hashtags": ["#lifestyle", "#instagram"],
-                "posting_patterns": {
-                    "most_active_time": "evening",
-                    "most_active_day": "weekend",
-                    "average_posts_per_week": max(1, len(posts) // 4) if posts else 3
-                },
-                "content_themes": ["lifestyle", "social"],
-                "engagement_metrics": {
-                    "average_likes": max(10, follower_count * 0.03),
-                    "average_comments": max(2, follower_count * 0.005),
-                    "engagement_rate": 3.5
-                }
-            },
-            "social_signals": {
-                "lifestyle_indicators": ["social_media_active", "digitally_connected"],
-                "values": ["authenticity", "connection"],
-                "relationship_readiness": "open_to_connections",
-                "communication_preference": "visual_and_text"
-            },
-            "metadata": {
-                "analyzed_at": datetime.now().isoformat(),
-                "confidence_score": 0.65,
-                "data_points_analyzed": len(posts) + (1 if bio else 0)
-            }
-        }
\ No newline at end of file
+        # Local heuristics over bio, captions and hashtags; defaults fill anything they can't infer
+        try:
+            return self._validate_and_enhance_result(self.local_analyzer.analyze(profile_data), profile_data)
+        except Exception as e:
+            # Last resort for every failed analysis, so it must not raise itself
+            print(f"Error in local analysis: {e}")
+            return self._validate_and_enhance_result({}, profile_data)
@@ -1,22 +1,179 @@
-from apify_client import ApifyClient
-from typing import List, Dict, Any
+import asyncio
+import time
+from typing import List, Dict, Any, Optional
 from models.schemas import ProfileScrapeResponse, ProfileData, PostsOnlyResponse, InstagramPost
-from utils.config import get_apify_token, username_to_url
+from services.cache import RequestCoalescer
+from services.quotas import charge_usage
+from utils.config import get_apify_token, username_to_url, normalize_username, get_scrape_cache_ttl
 import json
 
+# Seconds a batch result stays under its batch key - long enough for workers waiting on the same run
+BATCH_HANDOFF_TTL = 60
+
 class InstagramProfileScraper:
-    def __init__(self):
-        self.client = ApifyClient(get_apify_token())
+    def __init__(self, cache=None, store=None):
+        self._client = None
+        # Optional ProfileStore: every scrape is persisted for the query endpoints
+        self.store = store
+        # Optional shared cache: identical scrapes (across requests and worker processes) run the actor once
+        self.coalescer = RequestCoalescer(cache) if cache is not None else None
+        self.active_runs = 0
+    
+    @property
+    def client(self):
+        """Apify client, created on first use to keep app startup fast"""
+        if self._client is None:
+            from apify_client import ApifyClient
+            
+            self._client = ApifyClient(get_apify_token())
+        return self._client
+    
+    def _run_actor(self, run_input: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Run the profile scraper actor and fetch its dataset (blocking)"""
+        # Run the Instagram Profile Scraper
+        run = self.client.actor("apify/instagram-profile-scraper").call(run_input=run_input)
+        
+        print(f"Profile scraper completed with status: {run['status']}")
+        
+        # Get the results
+        return list(self.client.dataset(run["defaultDatasetId"]).iterate_items())
+    
+    async def drain(self, timeout: float) -> bool:
+        """Wait for in-flight actor runs to finish (graceful shutdown); False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.active_runs and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        return self.active_runs == 0
     
     async def scrape_profile(
         self, 
         usernames: List[str], 
         results_limit: int = 15, 
-        add_parent_data: bool = True
+        add_parent_data: bool = True,
+        refresh: bool = False
     ) -> ProfileScrapeResponse:
         """
-        Scrape Instagram profiles using Method 2 (Profile Scraper)
+        Scrape Instagram profiles using Method 2 (Profile Scraper).
+        Usernames, @names and profile URLs are normalized and deduplicated first,
+        profiles scraped recently enough (with at least results_limit posts) are
+        served from the cache, and the actor only runs for the rest. Results come
+        back in the caller's order, one entry per requested username.
+        refresh=True skips cached results (an identical in-flight run is still shared).
         """
+        requested = [normalize_username(u) for u in usernames]
+        unique = list(dict.fromkeys(name for name in requested if name))
+        invalid = [u for u, name in zip(usernames, requested) if not name]
+        if not unique:
+            return ProfileScrapeResponse(
+                success=False,
+                profiles_scraped=0,
+                total_items=0,
+                data=[],
+                message=f"No valid Instagram usernames in {usernames}"
+            )
+        
+        profiles = {} if refresh else await self._cached_profiles(unique, results_limit, add_parent_data)
+        stale = [name for name in unique if name not in profiles]
+        result = None
+        if stale:
+            result = await self._scrape_batch(stale, results_limit, add_parent_data, refresh)
+            for profile in result.data:
+                if profile.username:
+                    profiles[profile.username.lower()] = profile
+        
+        data = [profiles[name] for name in requested if name in profiles]
+        if result is not None and not data:
+            return result
+        notes = []
+        if len(stale) < len(unique):
+            notes.append(f"{len(unique) - len(stale)} served from cache")
+        if result is not None and not result.success:
+            notes.append(result.message)
+        if invalid:
+            notes.append(f"skipped invalid usernames {invalid}")
+        if result is not None and result.success and not notes:
+            message = result.message
+        else:
+            message = f"Returned {len(data)} profiles" + (f" ({'; '.join(notes)})" if notes else "")
+        return ProfileScrapeResponse(
+            success=bool(data),
+            profiles_scraped=len(data),
+            total_items=len(data),
+            data=data,
+            message=message
+        )
+    
+    async def _cached_profiles(self, names: List[str], results_limit: int,
+                         add_parent_data: bool) -> Dict[str, ProfileData]:
+        """Profiles of names cached with at least results_limit posts, cut down to results_limit"""
+        if self.coalescer is None:
+            return {}
+        profiles = {}
+        for name in names:
+            entry = await self.coalescer.cache.aget(("profile", name, add_parent_data))
+            if entry is None or entry["limit"] < results_limit:
+                continue
+            profile = ProfileData(**entry["profile"])
+            if profile.latestPosts:
+                profile.latestPosts = profile.latestPosts[:results_limit]
+            profiles[name] = profile
+        if profiles:
+            print(f"Serving cached profiles {list(profiles)}")
+        return profiles
+    
+    async def _remember_profiles(self, result: ProfileScrapeResponse, results_limit: int,
+                           add_parent_data: bool, force: bool = False) -> None:
+        """Cache each scraped profile on its own, unless a larger scrape of it is still cached"""
+        cache = self.coalescer.cache
+        for profile in result.data:
+            if not profile.username:
+                continue
+            key = ("profile", profile.username.lower(), add_parent_data)
+            existing = await cache.aget(key)
+            if force or existing is None or results_limit >= existing["limit"]:
+                await cache.aset(key, {"limit": results_limit, "profile": profile.model_dump()}, get_scrape_cache_ttl())
+    
+    async def _scrape_batch(
+        self,
+        names: List[str],
+        results_limit: int,
+        add_parent_data: bool,
+        refresh: bool
+    ) -> ProfileScrapeResponse:
+        """
+        One actor run for normalized, deduplicated names. Identical runs in flight
+        (in this or another worker) are shared; reuse afterwards goes through the
+        per-profile cache entries written on success.
+        """
+        if self.coalescer is None:
+            return await self._scrape_profile(names, results_limit, add_parent_data)
+        
+        names = tuple(sorted(names))
+        cache_key = ("scrape", names, results_limit, add_parent_data)
+        if refresh:
+            await self.coalescer.cache.adelete(cache_key)
+        
+        async def compute():
+            result = await self._scrape_profile(list(names), results_limit, add_parent_data)
+            if result.success:
+                await self._remember_profiles(result, results_limit, add_parent_data, force=refresh)
+            return result.model_dump()
+        
+        # The batch entry only hands the result to callers waiting on the same run
+        result = await self.coalescer.get_or_compute(
+            cache_key,
+            compute,
+            ttl_seconds=BATCH_HANDOFF_TTL,
+            should_cache=lambda value: value["success"]
+        )
+        return ProfileScrapeResponse(**result)
+    
+    async def _scrape_profile(
+        self,
+        usernames: List[str],
+        results_limit: int,
+        add_parent_data: bool
+    ) -> ProfileScrapeResponse:
         try:
             print(f"Scraping profiles: {usernames}")
             
@@ -26,13 +183,13 @@ class InstagramProfileScraper:
                 "addParentData": add_parent_data
             }
             
-            # Run the Instagram Profile Scraper
-            run = self.client.actor("apify/instagram-profile-scraper").call(run_input=run_input)
-            
-            print(f"Profile scraper completed with status: {run['status']}")
-            
-            # Get the results
-            items = list(self.client.dataset(run["defaultDatasetId"]).iterate_items())
+            # The Apify client is blocking; run it off the event loop so other requests keep flowing
+            charge_usage("actor_runs")
+            self.active_runs += 1
+            try:
+                items = await asyncio.to_thread(self._run_actor, run_input)
+            finally:
+                self.active_runs -= 1
             
             if not items:
                 return ProfileScrapeResponse(
@@ -62,6 +219,12 @@ class InstagramProfileScraper:
                 )
                 processed_profiles.append(profile_data)
             
+            if self.store is not None:
+                try:
+                    await asyncio.to_thread(self.store.save_profiles, processed_profiles)
+                except Exception as e:
+                    print(f"Error saving scraped profiles: {e}")
+            
             return ProfileScrapeResponse(
                 success=True,
                 profiles_scraped=len(processed_profiles),
@@ -0,0 +1,97 @@
+import json
+import re
+from typing import Any, Optional
+
+TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def _find_json_start(text: str) -> int:
+    """Index of the first '{' or '[' (skips markdown fences and any preamble)"""
+    brace = text.find('{')
+    bracket = text.find('[')
+    if brace == -1:
+        return bracket
+    if bracket == -1:
+        return brace
+    return min(brace, bracket)
+
+
+def parse_json_response(text: str) -> Optional[Any]:
+    """
+    Parse a JSON object/array out of an LLM response in a single pass.
+
+    Handles markdown fences, leading/trailing prose, raw newlines inside strings
+    and truncated output. When the output is cut off, everything up to the last
+    completed value is closed off and returned, so a partial analysis is still
+    usable; an unfinished object inside an array is dropped, not kept half-empty.
+    Returns None when nothing could be recovered.
+    """
+    if not text:
+        return None
+
+    # Fast path: structured output mode returns bare JSON
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+
+    start = _find_json_start(text)
+    if start == -1:
+        return None
+
+    stack = []
+    in_string = False
+    escape = False
+    # Last position where everything before it is complete, with the closers needed there
+    safe_end = -1
+    safe_closers = ''
+
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return _loads(text[start:i + 1])
+            safe_end = i + 1
+            safe_closers = ''.join(reversed(stack))
+        elif char == ',' and (stack[-1] == ']' or len(stack) == 1):
+            # Array elements before a comma are complete; so are the top-level object's
+            # fields. A comma inside a nested object is not: that object would be cut short.
+            safe_end = i
+            safe_closers = ''.join(reversed(stack))
+
+    # Truncated output - close off the last complete prefix
+    if safe_end == -1:
+        return None
+    print("Recovered partial JSON from truncated response")
+    return _loads(text[start:safe_end] + safe_closers)
+
+
+def _loads(candidate: str) -> Optional[Any]:
+    try:
+        return json.loads(candidate, strict=False)
+    except json.JSONDecodeError:
+        pass
+    # Trailing commas are the most common remaining mistake
+    try:
+        return json.loads(TRAILING_COMMA_PATTERN.sub(r'\1', candidate), strict=False)
+    except json.JSONDecodeError as e:
+        print(f"Failed to parse JSON response: {e}")
+        return None
@@ -0,0 +1,266 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+from services.json_parser import parse_json_response
+from services.prompt_builder import estimate_tokens
+from services.quotas import charge_usage
+from utils.config import (
+    get_gemini_api_key,
+    get_gemini_structured_output,
+    get_llm_providers,
+    get_llm_race,
+    get_llm_max_requests,
+    get_llm_hedge_percentile,
+    get_llm_hedge_default_delay,
+    get_llm_hedge_min_delay,
+)
+
+# Latency samples kept per model, and how many are needed before the percentile replaces the default delay
+LATENCY_WINDOW = 500
+MIN_LATENCY_SAMPLES = 20
+
+# Top-level JSON type each response schema type must parse to
+SCHEMA_TYPES = {"OBJECT": dict, "ARRAY": list}
+
+
+class LLMResponse:
+    __slots__ = ("text", "tokens")
+
+    def __init__(self, text: str, tokens: int):
+        self.text = text
+        self.tokens = tokens
+
+
+class GeminiProvider:
+    """One Gemini model; the client is created on first use"""
+
+    def __init__(self, model_name: str, api_key: Optional[str] = None):
+        self.name = model_name
+        self.api_key = api_key
+        self.structured_output = get_gemini_structured_output(model_name)
+        self._model = None
+
+    @property
+    def model(self):
+        # google.generativeai is slow to import, and a missing key should only fail LLM calls
+        if self._model is None:
+            if not self.api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables")
+            import google.generativeai as genai
+
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.name)
+        return self._model
+
+    def _generation_config(self, response_schema: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Generation config asking for JSON output when structured-output mode is on"""
+        if not self.structured_output:
+            return None
+        config: Dict[str, Any] = {"response_mime_type": "application/json"}
+        if response_schema:
+            config["response_schema"] = response_schema
+        return config
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> LLMResponse:
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=self._generation_config(response_schema)
+        )
+        return LLMResponse(response.text, self._token_count(prompt, response))
+
+    @staticmethod
+    def _token_count(prompt: str, response) -> int:
+        """Tokens billed for a call, estimated when the response carries no usage metadata"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "total_token_count", 0):
+            return usage.total_token_count
+        return estimate_tokens(prompt) + estimate_tokens(response.text)
+
+    def warm_up(self) -> None:
+        self.model
+
+
+class FakeProvider:
+    """
+    Local stand-in for trying out hedging and racing without an API key.
+    Answers after latency seconds, or tail_factor times that for tail_rate of
+    calls, with response_text (default: an empty object/array matching the schema).
+    """
+
+    def __init__(self, name: str = "fake", latency: float = 0.2, tail_rate: float = 0.05,
+                 tail_factor: float = 10.0, fail_rate: float = 0.0, response_text: Optional[str] = None):
+        self.name = name
+        self.latency = latency
+        self.tail_rate = tail_rate
+        self.tail_factor = tail_factor
+        self.fail_rate = fail_rate
+        self.response_text = response_text
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> LLMResponse:
+        slow = random.random() < self.tail_rate
+        await asyncio.sleep(self.latency * (self.tail_factor if slow else 1.0) * random.uniform(0.8, 1.2))
+        if random.random() < self.fail_rate:
+            raise RuntimeError(f"{self.name} failed")
+        text = self.response_text
+        if text is None:
+            text = "[]" if (response_schema or {}).get("type") == "ARRAY" else "{}"
+        return LLMResponse(text, estimate_tokens(prompt) + estimate_tokens(text))
+
+    def warm_up(self) -> None:
+        pass
+
+
+def create_providers(specs: List[Tuple[str, str]]) -> List[Any]:
+    """Providers from LLM_PROVIDERS entries, e.g. ("gemini", "gemini-1.5-flash") or ("fake", "200")"""
+    providers = []
+    for kind, value in specs:
+        if kind == "gemini":
+            providers.append(GeminiProvider(value, get_gemini_api_key()))
+        elif kind == "fake":
+            providers.append(FakeProvider(f"fake-{value}ms", latency=float(value) / 1000))
+        else:
+            raise ValueError(f"Unknown LLM provider {kind!r} in LLM_PROVIDERS")
+    return providers
+
+
+class ModelLatency:
+    """Recent call latencies and outcome counts of one model"""
+
+    def __init__(self):
+        self.samples: deque = deque(maxlen=LATENCY_WINDOW)
+        self.counts = dict.fromkeys(("requests", "hedges", "wins", "invalid", "errors", "cancelled"), 0)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = {
+            f"p{p}_ms": round(value * 1000, 1) if value is not None else None
+            for p, value in ((p, self.percentile(p)) for p in (50, 95, 99))
+        }
+        return {**self.counts, "samples": len(self.samples), **latencies}
+
+
+class LLMExecutionPolicy:
+    """
+    Runs a prompt against one or more providers and returns the first valid
+    parsed JSON. Hedging sends another request (the next provider, or the same
+    model again) once the current one is slower than the primary model's
+    LLM_HEDGE_PERCENTILE latency; racing (LLM_RACE) starts every provider at
+    once. Requests still running when a result wins are cancelled.
+    """
+
+    def __init__(self, providers: Optional[List[Any]] = None):
+        self.providers = providers or create_providers(get_llm_providers())
+        self.race = get_llm_race()
+        self.max_requests = len(self.providers) if self.race else get_llm_max_requests()
+        self.hedge_percentile = get_llm_hedge_percentile()
+        self.default_delay = get_llm_hedge_default_delay()
+        self.min_delay = get_llm_hedge_min_delay()
+        self.latency: Dict[str, ModelLatency] = {provider.name: ModelLatency() for provider in self.providers}
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait on the in-flight request before hedging, None when hedging is off"""
+        if self.race or self.hedge_percentile <= 0 or self.max_requests < 2:
+            return None
+        delay = self.latency[self.providers[0].name].percentile(self.hedge_percentile)
+        return max(self.min_delay, self.default_delay if delay is None else delay)
+
+    @staticmethod
+    def _valid(result: Any, response_schema: Optional[Dict[str, Any]]) -> bool:
+        if result is None:
+            return False
+        expected = SCHEMA_TYPES.get((response_schema or {}).get("type"))
+        return expected is None or isinstance(result, expected)
+
+    async def generate_json(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """
+        First valid parsed result across the attempts. Returns None if every
+        attempt answered with nothing usable; re-raises if every attempt failed.
+        """
+        pending: Dict[asyncio.Future, Tuple[Any, float, bool]] = {}
+        launched = 0
+        got_response = False
+        last_error: Optional[Exception] = None
+
+        def launch() -> None:
+            nonlocal launched
+            provider = self.providers[launched % len(self.providers)]
+            stats = self.latency[provider.name]
+            stats.counts["requests"] += 1
+            if launched and not self.race:
+                stats.counts["hedges"] += 1
+            # Attempts started with the call (the primary, or every racer) time the model's real latency
+            primary = self.race or not launched
+            pending[asyncio.ensure_future(provider.generate(prompt, response_schema))] = (
+                provider, time.perf_counter(), primary
+            )
+            launched += 1
+
+        for _ in range(self.max_requests if self.race else 1):
+            launch()
+        try:
+            while pending:
+                delay = self.hedge_delay() if launched < self.max_requests else None
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                for task in done:
+                    provider, started, _ = pending.pop(task)
+                    stats = self.latency[provider.name]
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        print(f"LLM request to {provider.name} failed: {e}")
+                        stats.counts["errors"] += 1
+                        last_error = e
+                        continue
+                    stats.record(time.perf_counter() - started)
+                    charge_usage("llm_tokens", response.tokens)
+                    got_response = True
+                    result = parse_json_response(response.text)
+                    if self._valid(result, response_schema):
+                        stats.counts["wins"] += 1
+                        return result
+                    stats.counts["invalid"] += 1
+                    print(f"Response text from {provider.name}: {response.text[:500]}")
+                # Nothing usable came back - fail over now instead of waiting out the hedge delay
+                if launched < self.max_requests and not pending:
+                    launch()
+            if got_response or last_error is None:
+                return None
+            raise last_error
+        finally:
+            for task, (provider, started, primary) in pending.items():
+                task.cancel()
+                stats = self.latency[provider.name]
+                stats.counts["cancelled"] += 1
+                if primary:
+                    # It would have taken at least this long. Leaving slow cancelled requests
+                    # out would pull the percentile (and the hedge delay) down with every hedge.
+                    stats.record(time.perf_counter() - started)
+                # The provider has most likely billed the prompt already
+                charge_usage("llm_tokens", estimate_tokens(prompt))
+
+    def warm_up(self) -> None:
+        for provider in self.providers:
+            provider.warm_up()
+
+    def stats(self) -> Dict[str, Any]:
+        hedge_delay = self.hedge_delay()
+        return {
+            "race": self.race,
+            "max_requests": self.max_requests,
+            "hedge_percentile": self.hedge_percentile,
+            "hedge_delay_ms": round(hedge_delay * 1000, 1) if hedge_delay is not None else None,
+            "models": {name: latency.snapshot() for name, latency in self.latency.items()},
+        }
@@ -0,0 +1,333 @@
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+from services.prompt_builder import EMOJI_RUN_PATTERN, HASHTAG_PATTERN, extract_hashtags
+from services.fallback_templates import get_fallback_catalog
+
+# Interest name -> (category, keywords). Keywords match as word prefixes, so
+# "photo" also covers "photography" and "#photooftheday".
+INTEREST_LEXICON: Dict[str, Tuple[str, List[str]]] = {
+    "Photography": ("art", [
+        "photo", "camera", "shot on", "capture", "lens", "portrait", "35mm", "film photography",
+        "canon", "nikon", "sony alpha", "fujifilm", "goldenhour", "golden hour", "shutter", "exposure",
+        "streetphotography", "landscape", "photographer", "snapshot",
+    ]),
+    "Travel": ("travel", [
+        "travel", "explore", "adventure", "journey", "wanderlust", "trip", "vacation", "holiday",
+        "passport", "backpack", "roadtrip", "road trip", "abroad", "island", "beach", "mountain",
+        "hiking", "hike", "airport", "flight", "hotel", "resort", "sightseeing", "tourist", "getaway",
+        "เที่ยว", "ทะเล",
+    ]),
+    "Fitness": ("fitness", [
+        "fitness", "gym", "workout", "training", "running", "marathon", "lifting", "deadlift",
+        "squat", "crossfit", "cardio", "gains", "fitfam", "personal trainer", "bodybuilding",
+        "pilates", "hiit", "5k", "10k", "triathlon", "cycling", "spin class",
+    ]),
+    "Food & Cooking": ("food", [
+        "food", "cook", "chef", "recipe", "foodie", "homemade", "baking", "bake", "brunch",
+        "dinner", "restaurant", "delicious", "yummy", "tasty", "dessert", "coffee", "latte",
+        "cafe", "sushi", "ramen", "pizza", "pasta", "streetfood", "street food", "อร่อย", "อาหาร",
+    ]),
+    "Art & Design": ("art", [
+        "art", "creative", "design", "artist", "paint", "drawing", "sketch", "illustration",
+        "watercolor", "gallery", "museum", "exhibition", "ceramic", "pottery", "craft", "handmade",
+        "calligraphy", "tattoo", "graphic design",
+    ]),
+    "Music": ("music", [
+        "music", "song", "concert", "band", "guitar", "piano", "singer", "singing", "dj", "festival",
+        "playlist", "spotify", "vinyl", "album", "gig", "rapper", "producer", "violin", "drums",
+        "karaoke", "เพลง",
+    ]),
+    "Technology": ("technology", [
+        "tech", "coding", "code", "developer", "programmer", "software", "startup", "ai",
+        "machine learning", "gadget", "iphone", "android", "gaming", "gamer", "esports", "python",
+        "javascript", "engineer", "robot", "crypto", "blockchain",
+    ]),
+    "Wellness": ("wellness", [
+        "wellness", "yoga", "meditation", "mindful", "selfcare", "self care", "mental health",
+        "healthy", "skincare", "spa", "retreat", "gratitude", "breathwork", "vegan", "plantbased",
+        "plant based", "organic", "sleep",
+    ]),
+    "Sports": ("sports", [
+        "football", "soccer", "basketball", "tennis", "golf", "badminton", "volleyball", "boxing",
+        "muay thai", "mma", "surf", "skate", "snowboard", "ski", "climbing", "swimming", "match",
+        "league", "premierleague", "nba", "ฟุตบอล",
+    ]),
+    "Business": ("business", [
+        "business", "entrepreneur", "founder", "ceo", "marketing", "brand", "startup life",
+        "hustle", "investing", "investor", "finance", "real estate", "ecommerce", "leadership",
+        "networking", "linkedin", "smallbusiness", "small business",
+    ]),
+    "Fashion": ("fashion", [
+        "fashion", "style", "outfit", "ootd", "streetwear", "vintage", "thrift", "designer",
+        "model", "makeup", "beauty", "lookbook", "sneaker", "runway", "wardrobe", "accessories",
+        "jewelry", "hairstyle",
+    ]),
+    "Pets & Animals": ("lifestyle", [
+        "dog", "dogs", "puppy", "cat", "cats", "kitten", "pet", "pets", "doggo", "catsofinstagram", "dogsofinstagram",
+        "animal", "rescue", "horse", "แมว", "หมา",
+    ]),
+    "Nature & Outdoors": ("travel", [
+        "nature", "outdoor", "camping", "forest", "sunset", "sunrise", "ocean", "lake", "waterfall",
+        "wildlife", "national park", "trail", "garden", "plants", "flowers",
+    ]),
+    "Reading & Writing": ("art", [
+        "book", "reading", "bookstagram", "novel", "author", "writer", "writing", "poetry", "poem",
+        "library", "journal", "literature",
+    ]),
+}
+
+# Personality hints implied by each interest category
+CATEGORY_TRAITS: Dict[str, Tuple[str, str]] = {
+    "art": ("Creative", "Expresses themselves through visual and creative work"),
+    "travel": ("Adventurous", "Seeks out new places and experiences"),
+    "fitness": ("Disciplined", "Commits to routines and personal goals"),
+    "food": ("Curious", "Enjoys discovering and sharing new flavours"),
+    "music": ("Expressive", "Connects with people and moments through music"),
+    "technology": ("Analytical", "Interested in how things work and what's next"),
+    "wellness": ("Mindful", "Values balance, health and self-reflection"),
+    "sports": ("Competitive", "Energised by challenge, teamwork and play"),
+    "business": ("Ambitious", "Driven, goal-oriented and entrepreneurial"),
+    "fashion": ("Stylish", "Pays attention to aesthetics and self-presentation"),
+    "lifestyle": ("Warm", "Shares everyday moments and the things they care about"),
+}
+
+# Where a keyword was found -> how much it says about the person
+SOURCE_WEIGHTS = {"bio": 3.0, "hashtag": 2.0, "caption": 1.0}
+
+KEYWORD_CATEGORY: Dict[str, str] = {}
+for _interest, (_category, _keywords) in INTEREST_LEXICON.items():
+    for _keyword in _keywords:
+        KEYWORD_CATEGORY.setdefault(_keyword.lower(), _interest)
+
+
+def _keyword_regex(keyword: str) -> str:
+    piece = re.escape(keyword)
+    if keyword.isascii():
+        # Latin keywords must start a word; very short ones must also end it ("art" but not "article")
+        piece = r'(?<![^\W_])' + piece
+        if len(keyword) <= 3:
+            piece += r'(?![^\W_])'
+    # Thai is written without spaces, so those keywords match anywhere
+    return piece
+
+# One alternation over every keyword, longest first, compiled once: a single findall per
+# text instead of one search per keyword. Python's backtracking re still tries the
+# alternatives at each position, so the cost grows with the lexicon - fine at this size,
+# a trie / Aho-Corasick matcher would be the next step if the lexicon grows a lot.
+KEYWORD_PATTERN = re.compile(
+    '(' + '|'.join(_keyword_regex(k) for k in sorted(KEYWORD_CATEGORY, key=len, reverse=True)) + ')',
+    re.IGNORECASE
+)
+
+
+def match_interests(text: str) -> Counter:
+    """Count lexicon interests mentioned in text"""
+    if not text:
+        return Counter()
+    counts = Counter()
+    for match in KEYWORD_PATTERN.findall(text):
+        # IGNORECASE also matches Unicode variants such as "İ" or "ſ" whose lower() is no keyword
+        interest = KEYWORD_CATEGORY.get(match.lower())
+        if interest is not None:
+            counts[interest] += 1
+    return counts
+
+
+def _parse_timestamp(value: Any) -> float:
+    """ISO timestamp -> epoch seconds (nan if missing/invalid)"""
+    if not value:
+        return float('nan')
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return float('nan')
+
+
+def compute_engagement_stats(posts: List[Dict[str, Any]], follower_count: int) -> Dict[str, Any]:
+    """Engagement and posting-cadence statistics over a profile's posts"""
+    import numpy as np  # deferred - keeps app startup fast
+
+    if not posts:
+        return {
+            "average_likes": 0, "median_likes": 0, "likes_variance": 0.0,
+            "average_comments": 0, "median_comments": 0,
+            "engagement_rate": 0.0, "median_engagement_rate": 0.0,
+            "posts_per_week": 0.0, "most_active_time": "evening", "most_active_day": "weekend",
+        }
+
+    likes = np.array([post.get('likes', 0) or 0 for post in posts], dtype=np.float64)
+    comments = np.array([post.get('comments', 0) or 0 for post in posts], dtype=np.float64)
+    per_post_rate = (likes + comments) / follower_count * 100 if follower_count > 0 else np.zeros_like(likes)
+
+    stats = {
+        "average_likes": int(likes.mean()),
+        "median_likes": int(np.median(likes)),
+        "likes_variance": round(float(likes.var()), 2),
+        "average_comments": int(comments.mean()),
+        "median_comments": int(np.median(comments)),
+        "engagement_rate": round(float(per_post_rate.mean()), 2),
+        "median_engagement_rate": round(float(np.median(per_post_rate)), 2),
+        "posts_per_week": 0.0,
+        "most_active_time": "evening",
+        "most_active_day": "weekend",
+    }
+
+    timestamps = np.array([_parse_timestamp(post.get('timestamp')) for post in posts], dtype=np.float64)
+    timestamps = np.sort(timestamps[~np.isnan(timestamps)])
+    if timestamps.size >= 2:
+        gaps_days = np.diff(timestamps) / 86400
+        median_gap = float(np.median(gaps_days))
+        stats["posts_per_week"] = round(7 / median_gap, 1) if median_gap > 0 else float(timestamps.size)
+    if timestamps.size:
+        # Hours/days in UTC - the scraper doesn't give us the poster's timezone
+        hours = (timestamps // 3600) % 24
+        weekdays = ((timestamps // 86400) + 3) % 7  # 1970-01-01 was a Thursday (Mon=0)
+        buckets = np.bincount(np.digitize(hours, [6, 12, 18]).astype(np.int64), minlength=4)
+        stats["most_active_time"] = ["night", "morning", "afternoon", "evening"][int(buckets.argmax())]
+        stats["most_active_day"] = "weekend" if (weekdays >= 5).mean() > 2 / 7 else "weekday"
+    return stats
+
+
+class LocalProfileAnalyzer:
+    """Heuristic profile analysis from bio, captions and hashtags - no LLM call"""
+
+    def analyze(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
+        bio = profile_data.get('bio', '') or ''
+        posts = profile_data.get('posts', []) or []
+        follower_count = profile_data.get('follower_count', 0) or 0
+        captions = [post.get('caption', '') or '' for post in posts]
+
+        hashtag_counts: Counter = Counter()
+        for caption in captions:
+            hashtag_counts.update(extract_hashtags(caption))
+
+        scores: Counter = Counter()
+        for interest, hits in match_interests(bio).items():
+            scores[interest] += hits * SOURCE_WEIGHTS["bio"]
+        for caption in captions:
+            for interest, hits in match_interests(HASHTAG_PATTERN.sub(' ', caption)).items():
+                scores[interest] += hits * SOURCE_WEIGHTS["caption"]
+        for tag, count in hashtag_counts.items():
+            for interest, hits in match_interests(tag).items():
+                scores[interest] += hits * count * SOURCE_WEIGHTS["hashtag"]
+
+        interests = self._rank_interests(scores)
+        engagement = compute_engagement_stats(posts, follower_count)
+        emoji_runs = sum(len(EMOJI_RUN_PATTERN.findall(caption)) for caption in captions + [bio])
+        emoji_per_text = emoji_runs / max(1, len(captions) + (1 if bio else 0))
+
+        return {
+            "personality_traits": self._infer_traits(interests, engagement, emoji_per_text),
+            "interests": interests[:4],
+            "conversation_starters": self._conversation_starters(interests, hashtag_counts, bool(bio)),
+            "communication_style": {
+                "tone": "playful" if emoji_per_text >= 2 else "friendly",
+                "formality_level": "casual",
+                "emoji_usage": "heavy" if emoji_per_text >= 2 else "moderate" if emoji_per_text >= 0.5 else "minimal",
+                "posting_frequency": self._posting_frequency(engagement["posts_per_week"]),
+                "engagement_style": "interactive" if engagement["average_comments"] >= 10 else "moderate",
+                "language_complexity": "moderate"
+            },
+            "content_analysis": {
+                "top_hashtags": [tag for tag, _ in hashtag_counts.most_common(5)],
+                "posting_patterns": {
+                    "most_active_time": engagement["most_active_time"],
+                    "most_active_day": engagement["most_active_day"],
+                    "average_posts_per_week": engagement["posts_per_week"]
+                },
+                "content_themes": [interest["name"].lower() for interest in interests[:4]] or ["lifestyle"],
+                "engagement_metrics": {
+                    "average_likes": engagement["average_likes"],
+                    "median_likes": engagement["median_likes"],
+                    "likes_variance": engagement["likes_variance"],
+                    "average_comments": engagement["average_comments"],
+                    "median_comments": engagement["median_comments"],
+                    "engagement_rate": engagement["engagement_rate"],
+                    "median_engagement_rate": engagement["median_engagement_rate"]
+                }
+            },
+            "social_signals": {
+                "lifestyle_indicators": [f"{interest['category']}_enthusiast" for interest in interests[:3]] or ["social_media_active"],
+                "values": ["authenticity", "connection"],
+                "relationship_readiness": "open_to_connections",
+                "communication_preference": "visual_and_text"
+            },
+            "metadata": {
+                "analyzed_at": datetime.now().isoformat(),
+                "confidence_score": round(min(0.8, 0.55 + 0.05 * len(interests)), 2),
+                "data_points_analyzed": len(captions) + (1 if bio else 0) + len(hashtag_counts),
+                "source": "local"
+            }
+        }
+
+    def _rank_interests(self, scores: Counter) -> List[Dict[str, Any]]:
+        if not scores:
+            return []
+        top = max(scores.values())
+        return [
+            {
+                "name": interest,
+                "confidence": round(0.6 + 0.3 * score / top, 2),
+                "category": INTEREST_LEXICON[interest][0]
+            }
+            for interest, score in scores.most_common()
+        ]
+
+    def _infer_traits(self, interests: List[Dict[str, Any]], engagement: Dict[str, Any],
+                      emoji_per_text: float) -> List[Dict[str, Any]]:
+        traits = []
+        seen = set()
+        for interest in interests:
+            trait, description = CATEGORY_TRAITS.get(interest["category"], CATEGORY_TRAITS["lifestyle"])
+            if trait in seen:
+                continue
+            seen.add(trait)
+            traits.append({
+                "trait": trait,
+                "confidence": round(max(0.6, interest["confidence"] - 0.05), 2),
+                "description": description,
+                "evidence": f"Recurring {interest['name'].lower()} content in bio, captions or hashtags"
+            })
+        if engagement["average_comments"] >= 10 or engagement["engagement_rate"] >= 3:
+            traits.append({
+                "trait": "Social",
+                "confidence": 0.7,
+                "description": "Enjoys connecting with others and sharing experiences",
+                "evidence": f"{engagement['engagement_rate']}% engagement rate with an active comment section"
+            })
+        if emoji_per_text >= 2:
+            traits.append({
+                "trait": "Playful",
+                "confidence": 0.65,
+                "description": "Lighthearted and expressive in how they write",
+                "evidence": "Frequent emoji use in captions"
+            })
+        return traits[:3]
+
+    def _conversation_starters(self, interests: List[Dict[str, Any]], hashtag_counts: Counter,
+                               has_bio: bool) -> List[str]:
+        templates = get_fallback_catalog()
+        starters = []
+        if interests:
+            starters.append(templates.analysis_starter("interest_origin", interest=interests[0]['name'].lower()))
+        if len(interests) > 1:
+            starters.append(templates.analysis_starter("interest_moment", interest=interests[1]['name'].lower()))
+        if hashtag_counts:
+            tag = hashtag_counts.most_common(1)[0][0]
+            starters.append(templates.analysis_starter("hashtag", hashtag=tag))
+        starters.append(templates.analysis_starter("passion"))
+        if not has_bio or len(starters) < 3:
+            starters.append(templates.analysis_starter("learn_more"))
+        return starters[:3]
+
+    @staticmethod
+    def _posting_frequency(posts_per_week: float) -> str:
+        if posts_per_week >= 5:
+            return "very_active"
+        if posts_per_week >= 1:
+            return "regular"
+        if posts_per_week > 0:
+            return "occasional"
+        return "unknown"
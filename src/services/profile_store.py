@@ -0,0 +1,445 @@
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from models.schemas import ProfileData
+from services.prompt_builder import extract_hashtags
+from services.sqlite_utils import connect
+from utils.config import get_store_path
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        username TEXT PRIMARY KEY,
+        full_name TEXT,
+        biography TEXT,
+        followers_count INTEGER,
+        following_count INTEGER,
+        posts_count INTEGER,
+        is_private INTEGER,
+        is_verified INTEGER,
+        profile_pic_url TEXT,
+        profile_url TEXT,
+        scraped_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_profiles_followers ON profiles (followers_count)",
+    """
+    CREATE TABLE IF NOT EXISTS profile_snapshots (
+        username TEXT NOT NULL,
+        scraped_at REAL NOT NULL,
+        followers_count INTEGER,
+        following_count INTEGER,
+        posts_count INTEGER,
+        PRIMARY KEY (username, scraped_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS posts (
+        short_code TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        caption TEXT,
+        likes_count INTEGER,
+        comments_count INTEGER,
+        timestamp TEXT,
+        posted_at REAL,
+        display_url TEXT,
+        type TEXT,
+        data TEXT NOT NULL,
+        scraped_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_posts_username_posted_at ON posts (username, posted_at)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_posted_at ON posts (posted_at)",
+    """
+    CREATE TABLE IF NOT EXISTS post_hashtags (
+        hashtag TEXT NOT NULL,
+        short_code TEXT NOT NULL,
+        PRIMARY KEY (hashtag, short_code)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_post_hashtags_short_code ON post_hashtags (short_code)",
+]
+
+# Full-text indexes, kept in step with posts/profiles by save_profiles() and keyed
+# by the rowid of the row they index. Hashtags are stored without "#".
+FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        caption, hashtags, tokenize = 'unicode61'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS profiles_fts USING fts5(
+        username, full_name, biography, tokenize = 'unicode61'
+    )
+    """,
+]
+
+# Column weights for bm25(): hashtags say more about a post than free text
+POSTS_FTS_WEIGHTS = "1.0, 2.0"
+PROFILES_FTS_WEIGHTS = "3.0, 2.0, 1.0"
+
+SEARCH_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+PROFILE_COLUMNS = (
+    "username, full_name, biography, followers_count, following_count, posts_count, "
+    "is_private, is_verified, profile_pic_url, profile_url, scraped_at"
+)
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Instagram ISO timestamp -> epoch seconds"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def post_hashtags(post: Dict[str, Any]) -> List[str]:
+    """Hashtags of a scraped post, normalized to lowercase with a leading #"""
+    tags = post.get('hashtags') or []
+    if tags:
+        return sorted({f"#{str(tag).lstrip('#').lower()}" for tag in tags if tag})
+    return sorted(set(extract_hashtags(post.get('caption') or '')))
+
+
+def build_fts_query(query: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last one
+    as a prefix (search-as-you-type). "#tag" terms only match the hashtags column.
+    """
+    terms = []
+    words = query.split()
+    for index, word in enumerate(words):
+        hashtag = word.startswith('#')
+        for token in SEARCH_TOKEN_PATTERN.findall(word.lower()):
+            term = f'"{token}"'
+            if index == len(words) - 1 and not hashtag:
+                term += '*'
+            terms.append(f"hashtags : {term}" if hashtag else term)
+    return ' AND '.join(terms) if terms else None
+
+
+def _profile_row(row) -> Dict[str, Any]:
+    return {
+        "username": row[0],
+        "fullName": row[1],
+        "biography": row[2],
+        "followersCount": row[3],
+        "followingCount": row[4],
+        "postsCount": row[5],
+        "isPrivate": bool(row[6]) if row[6] is not None else None,
+        "isVerified": bool(row[7]) if row[7] is not None else None,
+        "profilePicUrl": row[8],
+        "profileUrl": row[9],
+        "scrapedAt": datetime.fromtimestamp(row[10]).isoformat(),
+    }
+
+
+class ProfileStore:
+    """
+    Embedded SQLite store for every scraped profile and post, indexed for
+    the query endpoints (posts by username and time, profiles by follower count,
+    posts by hashtag). Safe to share between worker processes.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_store_path()
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self.search_enabled = True
+        with self._lock:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            try:
+                for statement in FTS_SCHEMA:
+                    self._conn.execute(statement)
+            except Exception as e:
+                # SQLite built without FTS5 - everything but /search keeps working
+                print(f"Full-text search disabled: {e}")
+                self.search_enabled = False
+        if self.search_enabled:
+            self._backfill_search_index()
+
+    def _backfill_search_index(self) -> None:
+        """
+        Index rows stored before the full-text tables existed. Each index is
+        filled only while it is empty; the counts are read inside the write
+        transaction so two workers starting together don't both backfill.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._conn.execute("SELECT COUNT(*) FROM posts_fts").fetchone()[0]:
+                    self._conn.execute(
+                        "INSERT INTO posts_fts (rowid, caption, hashtags) "
+                        "SELECT p.rowid, p.caption, COALESCE((SELECT group_concat(substr(h.hashtag, 2), ' ') "
+                        "FROM post_hashtags h WHERE h.short_code = p.short_code), '') "
+                        "FROM posts p"
+                    )
+                if not self._conn.execute("SELECT COUNT(*) FROM profiles_fts").fetchone()[0]:
+                    self._conn.execute(
+                        "INSERT INTO profiles_fts (rowid, username, full_name, biography) "
+                        "SELECT rowid, username, full_name, biography FROM profiles"
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def save_profiles(self, profiles: List[ProfileData]) -> int:
+        """Upsert profiles and their latest posts in one transaction; returns posts written"""
+        now = time.time()
+        profile_rows = []
+        snapshot_rows = []
+        post_rows = []
+        hashtag_rows = []
+        short_codes = []
+        post_fts_rows = []
+        for profile in profiles:
+            if not profile.username:
+                continue
+            username = profile.username.lower()
+            profile_rows.append((
+                username, profile.fullName, profile.biography, profile.followersCount,
+                profile.followingCount, profile.postsCount, profile.isPrivate, profile.isVerified,
+                profile.profilePicUrl, profile.profileUrl, now
+            ))
+            snapshot_rows.append((username, now, profile.followersCount, profile.followingCount, profile.postsCount))
+            for post in profile.latestPosts or []:
+                short_code = post.get('shortCode')
+                if not short_code:
+                    continue
+                short_codes.append(short_code)
+                post_rows.append((
+                    short_code, username, post.get('caption'), post.get('likesCount'),
+                    post.get('commentsCount'), post.get('timestamp'), parse_timestamp(post.get('timestamp')),
+                    post.get('displayUrl'), post.get('type'), json.dumps(post, default=str), now
+                ))
+                tags = post_hashtags(post)
+                hashtag_rows.extend((tag, short_code) for tag in tags)
+                post_fts_rows.append((post.get('caption') or '', ' '.join(tag[1:] for tag in tags), short_code))
+
+        if not profile_rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Upserts (not INSERT OR REPLACE) keep rowids stable for the full-text index
+                self._conn.executemany(
+                    f"INSERT INTO profiles ({PROFILE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (username) DO UPDATE SET full_name = excluded.full_name, "
+                    "biography = excluded.biography, followers_count = excluded.followers_count, "
+                    "following_count = excluded.following_count, posts_count = excluded.posts_count, "
+                    "is_private = excluded.is_private, is_verified = excluded.is_verified, "
+                    "profile_pic_url = excluded.profile_pic_url, profile_url = excluded.profile_url, "
+                    "scraped_at = excluded.scraped_at",
+                    profile_rows
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO profile_snapshots VALUES (?, ?, ?, ?, ?)", snapshot_rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (short_code) DO UPDATE SET username = excluded.username, "
+                    "caption = excluded.caption, likes_count = excluded.likes_count, "
+                    "comments_count = excluded.comments_count, timestamp = excluded.timestamp, "
+                    "posted_at = excluded.posted_at, display_url = excluded.display_url, "
+                    "type = excluded.type, data = excluded.data, scraped_at = excluded.scraped_at",
+                    post_rows
+                )
+                self._conn.executemany(
+                    "DELETE FROM post_hashtags WHERE short_code = ?", [(code,) for code in short_codes]
+                )
+                self._conn.executemany("INSERT OR IGNORE INTO post_hashtags VALUES (?, ?)", hashtag_rows)
+                if self.search_enabled:
+                    self._update_search_index(profile_rows, post_fts_rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(post_rows)
+
+    def _update_search_index(self, profile_rows, post_fts_rows) -> None:
+        """Replace the full-text entries of the profiles/posts just written (inside the write transaction)"""
+        self._conn.executemany(
+            "DELETE FROM posts_fts WHERE rowid = (SELECT rowid FROM posts WHERE short_code = ?)",
+            [(row[2],) for row in post_fts_rows]
+        )
+        self._conn.executemany(
+            "INSERT INTO posts_fts (rowid, caption, hashtags) "
+            "SELECT rowid, ?, ? FROM posts WHERE short_code = ?",
+            post_fts_rows
+        )
+        usernames = [(row[0],) for row in profile_rows]
+        self._conn.executemany(
+            "DELETE FROM profiles_fts WHERE rowid = (SELECT rowid FROM profiles WHERE username = ?)", usernames
+        )
+        self._conn.executemany(
+            "INSERT INTO profiles_fts (rowid, username, full_name, biography) "
+            "SELECT rowid, username, full_name, biography FROM profiles WHERE username = ?",
+            usernames
+        )
+
+    def search_posts(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Posts matching query in caption or hashtags, best bm25 match first"""
+        fts_query = build_fts_query(query)
+        if not fts_query:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT p.data, bm25(posts_fts, {POSTS_FTS_WEIGHTS}) AS score "
+                "FROM posts_fts JOIN posts p ON p.rowid = posts_fts.rowid "
+                "WHERE posts_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+                (fts_query, limit, offset)
+            ).fetchall()
+        results = []
+        for data, score in rows:
+            post = json.loads(data)
+            post["score"] = round(-score, 4)
+            results.append(post)
+        return results
+
+    def search_profiles(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Profiles matching query in username, name or bio, best bm25 match first"""
+        fts_query = build_fts_query(query.replace('#', ' '))
+        if not fts_query:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join('p.' + c.strip() for c in PROFILE_COLUMNS.split(','))}, "
+                f"bm25(profiles_fts, {PROFILES_FTS_WEIGHTS}) AS score "
+                "FROM profiles_fts JOIN profiles p ON p.rowid = profiles_fts.rowid "
+                "WHERE profiles_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+                (fts_query, limit, offset)
+            ).fetchall()
+        results = []
+        for row in rows:
+            profile = _profile_row(row)
+            profile["score"] = round(-row[-1], 4)
+            results.append(profile)
+        return results
+
+    def get_profile(self, username: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {PROFILE_COLUMNS} FROM profiles WHERE username = ?", (username.lower(),)
+            ).fetchone()
+        return _profile_row(row) if row else None
+
+    def find_profiles(self, min_followers: Optional[int] = None, max_followers: Optional[int] = None,
+                      is_verified: Optional[bool] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Profiles filtered by follower range (served from idx_profiles_followers), largest first"""
+        clauses = []
+        params: List[Any] = []
+        if min_followers is not None:
+            clauses.append("followers_count >= ?")
+            params.append(min_followers)
+        if max_followers is not None:
+            clauses.append("followers_count <= ?")
+            params.append(max_followers)
+        if is_verified is not None:
+            clauses.append("is_verified = ?")
+            params.append(int(is_verified))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {PROFILE_COLUMNS} FROM profiles {where} "
+                f"ORDER BY followers_count DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [_profile_row(row) for row in rows]
+
+    def get_posts(self, username: str, since: Optional[float] = None, until: Optional[float] = None,
+                  limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """A user's posts in [since, until], newest first (served from idx_posts_username_posted_at)"""
+        clauses = ["username = ?"]
+        params: List[Any] = [username.lower()]
+        if since is not None:
+            clauses.append("posted_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("posted_at <= ?")
+            params.append(until)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM posts WHERE {' AND '.join(clauses)} "
+                f"ORDER BY posted_at DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_posts_by_hashtag(self, hashtag: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Posts tagged with hashtag, newest first"""
+        tag = f"#{hashtag.lstrip('#').lower()}"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.data FROM post_hashtags h JOIN posts p ON p.short_code = h.short_code "
+                "WHERE h.hashtag = ? ORDER BY p.posted_at DESC LIMIT ? OFFSET ?",
+                (tag, limit, offset)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _profile_filter(self, usernames: Optional[List[str]], min_followers: Optional[int],
+                        max_followers: Optional[int], alias: str) -> Tuple[str, List[Any]]:
+        clauses = []
+        params: List[Any] = []
+        if usernames:
+            clauses.append(f"{alias}.username IN ({', '.join('?' * len(usernames))})")
+            params.extend(u.lower() for u in usernames)
+        if min_followers is not None:
+            clauses.append(f"{alias}.followers_count >= ?")
+            params.append(min_followers)
+        if max_followers is not None:
+            clauses.append(f"{alias}.followers_count <= ?")
+            params.append(max_followers)
+        return (' AND '.join(clauses) or '1'), params
+
+    def load_engagement_rows(self, usernames: Optional[List[str]] = None,
+                             min_followers: Optional[int] = None, max_followers: Optional[int] = None,
+                             since: Optional[float] = None) -> Dict[str, List[tuple]]:
+        """
+        Raw rows for bulk analytics, as plain tuples ready to load into arrays:
+        profiles (username, followers, following, posts), posts (username, likes,
+        comments, posted_at) and snapshots (username, scraped_at, followers).
+        """
+        where, params = self._profile_filter(usernames, min_followers, max_followers, "pr")
+        post_where = where
+        post_params = list(params)
+        snapshot_where = where
+        snapshot_params = list(params)
+        if since is not None:
+            post_where += " AND p.posted_at >= ?"
+            post_params.append(since)
+            snapshot_where += " AND s.scraped_at >= ?"
+            snapshot_params.append(since)
+        with self._lock:
+            profiles = self._conn.execute(
+                "SELECT pr.username, pr.followers_count, pr.following_count, pr.posts_count "
+                f"FROM profiles pr WHERE {where}",
+                params
+            ).fetchall()
+            posts = self._conn.execute(
+                "SELECT p.username, p.likes_count, p.comments_count, p.posted_at "
+                f"FROM posts p JOIN profiles pr ON pr.username = p.username WHERE {post_where}",
+                post_params
+            ).fetchall()
+            snapshots = self._conn.execute(
+                "SELECT s.username, s.scraped_at, s.followers_count "
+                f"FROM profile_snapshots s JOIN profiles pr ON pr.username = s.username WHERE {snapshot_where}",
+                snapshot_params
+            ).fetchall()
+        return {"profiles": profiles, "posts": posts, "snapshots": snapshots}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "profiles": self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0],
+                "posts": self._conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0],
+                "hashtags": self._conn.execute("SELECT COUNT(DISTINCT hashtag) FROM post_hashtags").fetchone()[0],
+            }
@@ -0,0 +1,256 @@
+import asyncio
+import statistics
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from models.schemas import ProfileData
+from services.profile_store import parse_timestamp
+from services.quotas import QuotaManager, KeyUsage
+from services.webhooks import SubscriptionStore, WebhookDispatcher
+from utils.config import (
+    get_watch_tick_interval,
+    get_watch_min_interval,
+    get_watch_max_interval,
+    get_watch_batch_size,
+    get_watch_follower_threshold,
+)
+
+# Posts fetched per refresh - enough to spot everything published since the last check
+WATCH_RESULTS_LIMIT = 12
+
+# Checks per typical gap between two posts of an account
+CHECKS_PER_POST = 4
+
+# Unchanged checks stretch the interval by this factor, up to BACKOFF_CAP x the posting cadence
+BACKOFF_FACTOR = 1.5
+BACKOFF_CAP = 4
+
+
+def diff_profile(baseline: Optional[Dict[str, Any]], profile: ProfileData,
+                 follower_threshold: int = 1) -> Optional[Dict[str, Any]]:
+    """
+    Changes between the watcher's last snapshot (SubscriptionStore.get_snapshots)
+    and a fresh scrape: new posts and follower/following/post count deltas. None if nothing changed.
+    """
+    if baseline is None:
+        return None  # first sighting - the scrape itself becomes the baseline
+
+    new_posts = []
+    newest = baseline["newestPostAt"]
+    for post in profile.latestPosts or []:
+        short_code = post.get('shortCode')
+        if not short_code or short_code in baseline["shortCodes"]:
+            continue
+        # Older posts that just scrolled into a longer result window are not news
+        posted_at = parse_timestamp(post.get('timestamp'))
+        if newest is not None and posted_at is not None and posted_at <= newest:
+            continue
+        new_posts.append({
+            "shortCode": short_code,
+            "url": f"https://www.instagram.com/p/{short_code}/",
+            "caption": post.get('caption'),
+            "type": post.get('type'),
+            "timestamp": post.get('timestamp'),
+            "displayUrl": post.get('displayUrl'),
+        })
+
+    counts = {}
+    for field, key, threshold in (
+        ("followers", "followersCount", follower_threshold),
+        ("following", "followingCount", 1),
+        ("posts", "postsCount", 1),
+    ):
+        previous = baseline[key]
+        current = getattr(profile, key)
+        if previous is None or current is None:
+            continue
+        if abs(current - previous) >= threshold:
+            counts[field] = {"previous": previous, "current": current, "delta": current - previous}
+
+    if not new_posts and not counts:
+        return None
+    return {"username": profile.username.lower(), "new_posts": new_posts, "counts": counts}
+
+
+def profile_snapshot(profile: ProfileData) -> tuple:
+    """The SubscriptionStore.save_snapshots row for a fresh scrape"""
+    short_codes = [post.get('shortCode') for post in profile.latestPosts or [] if post.get('shortCode')]
+    times = [t for t in (parse_timestamp(post.get('timestamp')) for post in profile.latestPosts or []) if t]
+    return (
+        profile.username.lower(), profile.followersCount, profile.followingCount,
+        profile.postsCount, short_codes, max(times) if times else None
+    )
+
+
+def posting_cadence(profile: ProfileData) -> Optional[float]:
+    """Median seconds between consecutive posts, or None with fewer than two dated posts"""
+    times = sorted(
+        (t for t in (parse_timestamp(post.get('timestamp')) for post in profile.latestPosts or []) if t),
+        reverse=True
+    )
+    gaps = [newer - older for newer, older in zip(times, times[1:]) if newer > older]
+    return statistics.median(gaps) if gaps else None
+
+
+def next_check_interval(cadence: Optional[float], previous_interval: float, changed: bool,
+                        min_interval: float, max_interval: float) -> float:
+    """
+    How long to wait before refreshing a profile again: a few checks per typical
+    posting gap, backing off while nothing changes and snapping back on a change
+    """
+    base = cadence / CHECKS_PER_POST if cadence else max_interval
+    base = min(max(base, min_interval), max_interval)
+    if changed or not previous_interval:
+        interval = base
+    else:
+        interval = max(base, min(previous_interval * BACKOFF_FACTOR, base * BACKOFF_CAP))
+    return min(max(interval, min_interval), max_interval)
+
+
+class ProfileWatcher:
+    """
+    Background loop that refreshes subscribed profiles when they are due,
+    diffs each against the snapshot taken at its previous check and queues one
+    batched webhook per subscription with everything that changed. The snapshot
+    is the watcher's own: ordinary scrapes update the profile store, not it.
+    With API keys configured, each actor run is charged to the keys whose
+    subscriptions it refreshes, and keys out of actor run quota stop being refreshed.
+    """
+
+    def __init__(self, scraper, subscriptions: SubscriptionStore, quotas: Optional[QuotaManager] = None):
+        self.scraper = scraper
+        self.subscriptions = subscriptions
+        self.quotas = quotas
+        self.dispatcher = WebhookDispatcher(subscriptions)
+        self.tick_interval = get_watch_tick_interval()
+        self.min_interval = get_watch_min_interval()
+        self.max_interval = get_watch_max_interval()
+        self.batch_size = get_watch_batch_size()
+        self.follower_threshold = get_watch_follower_threshold()
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.changes = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.dispatcher.close()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in profile watcher: {e}")
+            await asyncio.sleep(self.tick_interval)
+
+    async def tick(self) -> int:
+        """Refresh every due profile, then send due webhooks; returns profiles checked"""
+        checked = 0
+        while True:
+            # Lease covers one actor run; if this worker dies the profiles become due again
+            due = await asyncio.to_thread(self.subscriptions.claim_due_profiles, self.batch_size, 600)
+            if not due:
+                break
+            await self.check_profiles(due)
+            checked += len(due)
+            if len(due) < self.batch_size:
+                break
+        await self.dispatcher.deliver_due()
+        return checked
+
+    async def check_profiles(self, due: List[tuple]) -> List[Dict[str, Any]]:
+        """Refresh (username, interval) pairs with one actor run and queue notifications"""
+        usernames = [username for username, _ in due]
+        intervals = dict(due)
+        baselines = await asyncio.to_thread(self.subscriptions.get_snapshots, usernames)
+        owners = await asyncio.to_thread(self.subscriptions.owners, usernames)
+        refresh, payers = self._billable(usernames, owners)
+        scraped = {}
+        if refresh:
+            result = await self.scraper.scrape_profile(
+                refresh, results_limit=WATCH_RESULTS_LIMIT, add_parent_data=True, refresh=True
+            )
+            # Background runs have no request key, so the scraper itself charges nobody
+            for usage in payers:
+                usage.charge("actor_runs")
+            self.checks += len(refresh)
+            if result.success:
+                scraped = {p.username.lower(): p for p in result.data if p.username}
+        changes = []
+        schedule = []
+        for username in usernames:
+            profile = scraped.get(username)
+            if profile is None:
+                # Scrape failed, the account is gone or no subscriber has quota - keep the current schedule
+                schedule.append((username, intervals[username] or self.min_interval, False))
+                continue
+            change = diff_profile(baselines.get(username), profile, self.follower_threshold)
+            if change:
+                changes.append(change)
+            interval = next_check_interval(
+                posting_cadence(profile), intervals[username], change is not None,
+                self.min_interval, self.max_interval
+            )
+            schedule.append((username, interval, change is not None))
+        await asyncio.to_thread(self.subscriptions.reschedule, schedule)
+
+        if changes:
+            self.changes += len(changes)
+            await asyncio.to_thread(self._enqueue_notifications, changes)
+        # Only now move the baseline, so a failure above re-detects the same changes next time
+        await asyncio.to_thread(
+            self.subscriptions.save_snapshots,
+            [profile_snapshot(scraped[username]) for username in usernames if username in scraped]
+        )
+        return changes
+
+    def _billable(self, usernames: List[str],
+                  owners: Dict[str, List[Optional[str]]]) -> Tuple[List[str], List[KeyUsage]]:
+        """
+        Usernames worth refreshing and the keys to charge for the run: subscriptions
+        made on an open API (no owner) are free, keyed ones need actor run quota left
+        """
+        if self.quotas is None or not self.quotas.enabled:
+            return usernames, []
+        refresh = []
+        payers: Dict[str, KeyUsage] = {}
+        for username in usernames:
+            covered = False
+            for owner in owners.get(username, []):
+                if owner is None:
+                    covered = True
+                    continue
+                usage = self.quotas.lookup_name(owner)
+                if usage is not None and (usage.name in payers or usage.buckets["actor_runs"].available()):
+                    payers[usage.name] = usage
+                    covered = True
+            if covered:
+                refresh.append(username)
+        return refresh, list(payers.values())
+
+    def _enqueue_notifications(self, changes: List[Dict[str, Any]]) -> None:
+        """One delivery per subscription, carrying the changes of every profile it follows"""
+        by_username = {change["username"]: change for change in changes}
+        detected_at = datetime.now().isoformat()
+        deliveries = []
+        for subscription_id, usernames in self.subscriptions.subscribers(list(by_username)).items():
+            deliveries.append((subscription_id, {
+                "event": "profiles.changed",
+                "subscription_id": subscription_id,
+                "detected_at": detected_at,
+                "changes": [by_username[username] for username in sorted(usernames)],
+            }))
+        self.subscriptions.enqueue(deliveries)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.subscriptions.stats()
+        stats.update({"running": self._task is not None, "checks": self.checks, "changes": self.changes})
+        return stats
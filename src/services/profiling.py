@@ -0,0 +1,146 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+# Leaf frames in these modules mean the thread is parked (event loop select, idle pool worker)
+IDLE_MODULES = ("selectors.py", "threading.py", "queue.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def fold_stack(frame) -> str:
+    """Frame chain as "root;...;leaf" - one line of Brendan Gregg's folded stack format"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def folded_output(counts: Dict[str, int]) -> str:
+    """Folded stacks ("stack count" per line), readable by flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+class SamplingProfiler:
+    """
+    Statistical CPU profiler: a thread snapshots every other thread's Python
+    stack at a fixed interval. Nothing runs between profiles.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> Dict[str, Any]:
+        """Sample all threads for seconds (blocking - run it in a worker thread)"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A CPU profile is already running")
+        try:
+            own_thread = threading.get_ident()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            counts: Counter = Counter()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    if not include_idle and frame.f_code.co_filename.endswith(IDLE_MODULES):
+                        continue
+                    name = thread_names.get(thread_id) or f"thread-{thread_id}"
+                    counts[f"{name};{fold_stack(frame)}"] += 1
+                samples += 1
+                time.sleep(interval)
+            return {"samples": samples, "stacks": counts}
+        finally:
+            self._lock.release()
+
+
+class AllocationTracker:
+    """
+    tracemalloc snapshots diffed over time, plus per-endpoint allocation counts
+    recorded by the profiling middleware. Off (and free) until start() is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self.endpoints: Dict[str, List[int]] = {}
+
+    def start(self, frames: int = 10) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = self._take_snapshot()
+        self.endpoints = {}
+        self.enabled = True
+
+    def stop(self) -> None:
+        self.enabled = False
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+    def record(self, endpoint: str, allocated_bytes: int, allocated_blocks: int) -> None:
+        """Add one request's net allocations (approximate while requests overlap)"""
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = [0, 0, 0, 0]
+        stats[0] += 1
+        stats[1] += allocated_bytes
+        stats[2] += allocated_blocks
+        stats[3] = max(stats[3], allocated_bytes)
+
+    def endpoint_report(self) -> List[Dict[str, Any]]:
+        report = [
+            {
+                "endpoint": endpoint,
+                "requests": requests,
+                "avg_net_bytes": total_bytes // requests,
+                "avg_net_blocks": total_blocks // requests,
+                "max_net_bytes": max_bytes,
+            }
+            for endpoint, (requests, total_bytes, total_blocks, max_bytes) in self.endpoints.items()
+        ]
+        return sorted(report, key=lambda row: row["avg_net_bytes"] * row["requests"], reverse=True)
+
+    def snapshot_diff(self, top: int = 25, group_by: str = "lineno") -> Dict[str, Any]:
+        """Allocation growth since the previous snapshot (or start), largest first"""
+        if not self.enabled:
+            raise RuntimeError("Allocation tracking is not running")
+        snapshot = self._take_snapshot()
+        stats = snapshot.compare_to(self._baseline, group_by)
+        self._baseline = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "top": [
+                {
+                    "location": [str(frame) for frame in stat.traceback] if group_by == "traceback"
+                    else str(stat.traceback[0]),
+                    "size_diff": stat.size_diff,
+                    "size": stat.size,
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                }
+                for stat in stats[:top]
+            ],
+        }
@@ -0,0 +1,442 @@
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+from utils.config import (
+    get_prompt_token_budget,
+    get_prompt_caption_max_chars,
+    get_batch_token_budget,
+    get_batch_max_profiles,
+    get_batch_caption_token_budget,
+)
+
+HASHTAG_PATTERN = re.compile(r'#\w+')
+MENTION_PATTERN = re.compile(r'@\w+')
+# Runs of emoji / pictographs / dingbats, optionally joined by ZWJ or variation selectors
+EMOJI_RUN_PATTERN = re.compile(
+    '(['
+    '\U0001F000-\U0001FAFF'
+    '\u2600-\u27BF'
+    '\u2B00-\u2BFF'
+    '\uFE0F\u200D'
+    ']+)'
+)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+NORMALIZE_PATTERN = re.compile(r'[^\w]+')
+
+# Captions whose word shingles overlap more than this are treated as duplicates
+DUPLICATE_SIMILARITY_THRESHOLD = 0.8
+# Rough characters-per-token ratio for Gemini tokenization of mixed-language text
+CHARS_PER_TOKEN = 4
+
+PROFILE_SECTION_TEMPLATE = """
+You are an expert social media analyst specializing in personality insights for dating and social networking apps. Analyze this Instagram profile and provide detailed insights that would help someone understand this person's personality, interests, and how to connect with them.
+
+PROFILE DATA:
+Name: {display_name}
+Username: @{username}
+Bio: "{bio}"
+Followers: {follower_count:,}
+Following: {following_count:,}
+Posts: {post_count}
+Engagement Rate: {engagement_rate:.1f}%
+Average Likes: {average_likes}
+Average Comments: {average_comments}
+Estimated Posts Per Week: {posts_per_week}
+
+RECENT POST CONTENT:
+{posts_text}
+
+HASHTAGS USED: {hashtags_text}
+"""
+
+ANALYSIS_STEPS = """
+ANALYSIS INSTRUCTIONS:
+1. Focus on personality traits that would be relevant for dating/friendship connections
+2. Identify genuine interests (not just surface-level hobbies)
+3. Create conversation starters that feel natural and engaging
+4. Analyze communication style for compatibility insights
+5. Provide realistic confidence scores based on evidence
+6. Fill content_analysis numbers from the profile data provided
+"""
+
+ANALYSIS_JSON_EXAMPLE = """{
+  "personality_traits": [
+    {
+      "trait": "Creative",
+      "confidence": 0.85,
+      "description": "Demonstrates artistic expression and creative thinking through visual content and captions",
+      "evidence": "Multiple artistic posts with thoughtful composition and creative captions"
+    }
+  ],
+  "interests": [
+    {
+      "name": "Photography",
+      "confidence": 0.90,
+      "category": "art"
+    }
+  ],
+  "conversation_starters": [
+    "I noticed you have a great eye for photography - what got you into capturing those kinds of moments?"
+  ],
+  "communication_style": {
+    "tone": "warm",
+    "formality_level": "casual",
+    "emoji_usage": "moderate",
+    "posting_frequency": "regular",
+    "engagement_style": "interactive",
+    "language_complexity": "moderate"
+  },
+  "content_analysis": {
+    "top_hashtags": ["#travel", "#food"],
+    "posting_patterns": {
+      "most_active_time": "evening",
+      "most_active_day": "weekend",
+      "average_posts_per_week": 3
+    },
+    "content_themes": ["photography", "lifestyle"],
+    "engagement_metrics": {
+      "average_likes": 120,
+      "average_comments": 8,
+      "engagement_rate": 2.4
+    }
+  },
+  "social_signals": {
+    "lifestyle_indicators": ["urban_professional", "creative_type"],
+    "values": ["authenticity", "creativity"],
+    "relationship_readiness": "open_to_connections",
+    "communication_preference": "visual_storytelling"
+  },
+  "metadata": {
+    "confidence_score": 0.82,
+    "data_points_analyzed": 12
+  }
+}
+"""
+
+ANALYSIS_GUIDELINES = """
+IMPORTANT GUIDELINES:
+- Base ALL insights on actual profile data provided
+- Return 3 personality traits, 4 interests and 3 conversation starters
+- Use confidence scores between 0.6-0.95 (be realistic)
+- Focus on positive traits and genuine interests
+- Make conversation starters specific and personalized
+- Ensure all JSON is valid and properly formatted
+- Categories for interests: art, travel, fitness, food, music, technology, wellness, sports, business, fashion
+"""
+
+# Static instructions and response schema - identical for every profile, so it is built once
+ANALYSIS_INSTRUCTIONS = (
+    ANALYSIS_STEPS
+    + "\nReturn ONLY a valid JSON object with this EXACT structure:\n\n"
+    + ANALYSIS_JSON_EXAMPLE
+    + ANALYSIS_GUIDELINES
+)
+
+ANALYSIS_INSTRUCTIONS_TOKENS = len(ANALYSIS_INSTRUCTIONS) // CHARS_PER_TOKEN + 1
+
+BATCH_INTRO = """
+You are an expert social media analyst specializing in personality insights for dating and social networking apps. Analyze EACH of the Instagram profiles below independently and provide detailed insights that would help someone understand that person's personality, interests, and how to connect with them.
+"""
+
+BATCH_PROFILE_TEMPLATE = """
+### PROFILE @{username}
+Name: {display_name}
+Bio: "{bio}"
+Followers: {follower_count:,} | Following: {following_count:,} | Posts: {post_count}
+Engagement Rate: {engagement_rate:.1f}% | Average Likes: {average_likes} | Average Comments: {average_comments} | Estimated Posts Per Week: {posts_per_week}
+Hashtags: {hashtags_text}
+Recent Captions:
+{posts_text}
+"""
+
+BATCH_ANALYSIS_INSTRUCTIONS = (
+    ANALYSIS_STEPS
+    + "\nReturn ONLY a valid JSON array with one object per profile, in the order given. "
+    + "Each object must have a \"username\" field (without @) and otherwise follow this EXACT structure:\n\n"
+    + ANALYSIS_JSON_EXAMPLE
+    + ANALYSIS_GUIDELINES
+)
+
+BATCH_FIXED_TOKENS = (len(BATCH_INTRO) + len(BATCH_ANALYSIS_INSTRUCTIONS)) // CHARS_PER_TOKEN + 1
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting (no tokenizer round trip)"""
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def extract_hashtags(text: str) -> List[str]:
+    """Extract lowercase hashtags from a caption"""
+    if not text:
+        return []
+    return HASHTAG_PATTERN.findall(text.lower())
+
+def clean_caption(caption: str, max_chars: Optional[int] = None) -> str:
+    """
+    Strip hashtag spam and emoji runs from a caption and truncate it.
+    Hashtags are reported separately in the prompt, so they are removed from the text.
+    """
+    if not caption:
+        return ""
+    text = HASHTAG_PATTERN.sub(' ', caption)
+    text = MENTION_PATTERN.sub('@user', text)
+    # Keep one emoji from each run - it still says something about tone
+    text = EMOJI_RUN_PATTERN.sub(lambda m: m.group(1)[0], text)
+    text = WHITESPACE_PATTERN.sub(' ', text).strip()
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars].rsplit(' ', 1)[0] + '...'
+    return text
+
+def _shingles(text: str) -> frozenset:
+    words = NORMALIZE_PATTERN.sub(' ', text.lower()).split()
+    if len(words) < 3:
+        return frozenset(words)
+    return frozenset(zip(words, words[1:], words[2:]))
+
+def dedupe_captions(captions: List[Tuple[str, int]],
+                    threshold: float = DUPLICATE_SIMILARITY_THRESHOLD) -> List[Tuple[str, int]]:
+    """
+    Drop near-identical captions (reposted promos, copy-pasted signatures).
+    Takes (caption, score) pairs and keeps the highest scoring copy.
+    """
+    kept: List[Tuple[str, int, frozenset]] = []
+    for caption, score in sorted(captions, key=lambda c: c[1], reverse=True):
+        shingles = _shingles(caption)
+        if not shingles:
+            continue
+        duplicate = False
+        for _, _, other in kept:
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append((caption, score, shingles))
+    return [(caption, score) for caption, score, _ in kept]
+
+
+class AnalysisPromptBuilder:
+    """Builds Gemini analysis prompts that fit within a token budget"""
+
+    def __init__(self, token_budget: Optional[int] = None, caption_max_chars: Optional[int] = None):
+        self.token_budget = token_budget or get_prompt_token_budget()
+        self.caption_max_chars = caption_max_chars or get_prompt_caption_max_chars()
+
+    def compute_stats(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compute hashtag and engagement statistics used in the prompt"""
+        posts = profile_data.get('posts', [])[:10]
+        hashtag_counts: Counter = Counter()
+        total_likes = 0
+        total_comments = 0
+
+        for post in posts:
+            hashtag_counts.update(extract_hashtags(post.get('caption', '') or ''))
+            total_likes += post.get('likes', 0) or 0
+            total_comments += post.get('comments', 0) or 0
+
+        follower_count = profile_data.get('follower_count', 0) or 0
+        post_count = profile_data.get('post_count', 0) or 0
+        average_likes = total_likes / len(posts) if posts else 0
+        average_comments = total_comments / len(posts) if posts else 0
+        avg_engagement = average_likes + average_comments
+        engagement_rate = (avg_engagement / follower_count * 100) if follower_count > 0 else 0
+
+        return {
+            "top_hashtags": [tag for tag, _ in hashtag_counts.most_common(10)],
+            "average_likes": int(average_likes),
+            "average_comments": int(average_comments),
+            "engagement_rate": engagement_rate,
+            "posts_per_week": max(1, post_count // 52) if post_count > 52 else post_count,
+        }
+
+    def select_captions(self, posts: List[Dict[str, Any]], token_budget: int) -> List[str]:
+        """Clean, dedupe and pick the most relevant captions that fit in token_budget"""
+        candidates = []
+        for post in posts[:10]:
+            caption = clean_caption(post.get('caption', '') or '', self.caption_max_chars)
+            if not caption:
+                continue
+            # Engagement is the main relevance signal; longer captions say a bit more about the person
+            score = (post.get('likes', 0) or 0) + 3 * (post.get('comments', 0) or 0) + min(len(caption), 200) // 4
+            candidates.append((caption, score))
+
+        selected = []
+        used = 0
+        for caption, _ in dedupe_captions(candidates):
+            cost = estimate_tokens(caption) + 2  # separator
+            if used + cost > token_budget:
+                continue
+            selected.append(caption)
+            used += cost
+        return selected
+
+    def _profile_fields(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Template fields shared by the single and batch prompt layouts"""
+        stats = self.compute_stats(profile_data)
+        return {
+            "display_name": profile_data.get('display_name', 'N/A'),
+            "username": profile_data.get('username', 'N/A'),
+            "bio": clean_caption(profile_data.get('bio', '') or '', self.caption_max_chars),
+            "follower_count": profile_data.get('follower_count', 0) or 0,
+            "following_count": profile_data.get('following_count', 0) or 0,
+            "post_count": profile_data.get('post_count', 0) or 0,
+            "engagement_rate": stats["engagement_rate"],
+            "average_likes": stats["average_likes"],
+            "average_comments": stats["average_comments"],
+            "posts_per_week": stats["posts_per_week"],
+            "hashtags_text": ', '.join(stats["top_hashtags"]) if stats["top_hashtags"] else 'None detected',
+        }
+
+    def build(self, profile_data: Dict[str, Any]) -> str:
+        """Build the full analysis prompt for a profile"""
+        fields = self._profile_fields(profile_data)
+
+        # Whatever the fixed parts don't use is available for captions
+        fixed_tokens = estimate_tokens(PROFILE_SECTION_TEMPLATE.format(posts_text='', **fields))
+        caption_budget = self.token_budget - fixed_tokens - ANALYSIS_INSTRUCTIONS_TOKENS
+        captions = self.select_captions(profile_data.get('posts', []), max(0, caption_budget))
+
+        posts_text = '\n---\n'.join(captions) if captions else 'No recent posts available'
+        return PROFILE_SECTION_TEMPLATE.format(posts_text=posts_text, **fields) + ANALYSIS_INSTRUCTIONS
+
+    def build_summary(self, profile_data: Dict[str, Any], caption_budget: Optional[int] = None) -> str:
+        """Build the compact per-profile block used in batch prompts"""
+        fields = self._profile_fields(profile_data)
+        captions = self.select_captions(
+            profile_data.get('posts', []),
+            caption_budget if caption_budget is not None else get_batch_caption_token_budget()
+        )
+        posts_text = '\n'.join(f"- {caption}" for caption in captions) if captions else '- No recent posts available'
+        return BATCH_PROFILE_TEMPLATE.format(posts_text=posts_text, **fields)
+
+    def pack_batches(self, profiles: List[Dict[str, Any]],
+                     token_budget: Optional[int] = None,
+                     max_profiles: Optional[int] = None) -> List[Tuple[List[Dict[str, Any]], str]]:
+        """
+        Greedily pack profile summaries into as few prompts as the token budget allows.
+        Returns (profiles_in_batch, prompt) pairs, preserving input order.
+        """
+        token_budget = token_budget or get_batch_token_budget()
+        max_profiles = max_profiles or get_batch_max_profiles()
+        # Each profile's reply is roughly as large as the JSON example, so reserve room for it too
+        per_profile_output = estimate_tokens(ANALYSIS_JSON_EXAMPLE)
+
+        batches: List[Tuple[List[Dict[str, Any]], str]] = []
+        current: List[Dict[str, Any]] = []
+        summaries: List[str] = []
+        used = BATCH_FIXED_TOKENS
+
+        def flush():
+            if current:
+                batches.append((list(current), BATCH_INTRO + ''.join(summaries) + BATCH_ANALYSIS_INSTRUCTIONS))
+                current.clear()
+                summaries.clear()
+
+        for profile_data in profiles:
+            summary = self.build_summary(profile_data)
+            cost = estimate_tokens(summary) + per_profile_output
+            if current and (used + cost > token_budget or len(current) >= max_profiles):
+                flush()
+                used = BATCH_FIXED_TOKENS
+            current.append(profile_data)
+            summaries.append(summary)
+            used += cost
+        flush()
+        return batches
+
+def _string_list() -> Dict[str, Any]:
+    return {"type": "ARRAY", "items": {"type": "STRING"}}
+
+# Response schema for structured-output mode (mirrors the example in ANALYSIS_INSTRUCTIONS)
+ANALYSIS_RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "personality_traits": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "trait": {"type": "STRING"},
+                    "confidence": {"type": "NUMBER"},
+                    "description": {"type": "STRING"},
+                    "evidence": {"type": "STRING"},
+                },
+                "required": ["trait", "confidence"],
+            },
+        },
+        "interests": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "name": {"type": "STRING"},
+                    "confidence": {"type": "NUMBER"},
+                    "category": {"type": "STRING"},
+                },
+                "required": ["name", "confidence", "category"],
+            },
+        },
+        "conversation_starters": _string_list(),
+        "communication_style": {
+            "type": "OBJECT",
+            "properties": {
+                "tone": {"type": "STRING"},
+                "formality_level": {"type": "STRING"},
+                "emoji_usage": {"type": "STRING"},
+                "posting_frequency": {"type": "STRING"},
+                "engagement_style": {"type": "STRING"},
+                "language_complexity": {"type": "STRING"},
+            },
+        },
+        "content_analysis": {
+            "type": "OBJECT",
+            "properties": {
+                "top_hashtags": _string_list(),
+                "posting_patterns": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "most_active_time": {"type": "STRING"},
+                        "most_active_day": {"type": "STRING"},
+                        "average_posts_per_week": {"type": "NUMBER"},
+                    },
+                },
+                "content_themes": _string_list(),
+                "engagement_metrics": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "average_likes": {"type": "NUMBER"},
+                        "average_comments": {"type": "NUMBER"},
+                        "engagement_rate": {"type": "NUMBER"},
+                    },
+                },
+            },
+        },
+        "social_signals": {
+            "type": "OBJECT",
+            "properties": {
+                "lifestyle_indicators": _string_list(),
+                "values": _string_list(),
+                "relationship_readiness": {"type": "STRING"},
+                "communication_preference": {"type": "STRING"},
+            },
+        },
+        "metadata": {
+            "type": "OBJECT",
+            "properties": {
+                "confidence_score": {"type": "NUMBER"},
+                "data_points_analyzed": {"type": "INTEGER"},
+            },
+        },
+    },
+    "required": ["personality_traits", "interests", "conversation_starters"],
+}
+
+BATCH_ANALYSIS_RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"username": {"type": "STRING"}, **ANALYSIS_RESPONSE_SCHEMA["properties"]},
+        "required": ["username"] + ANALYSIS_RESPONSE_SCHEMA["required"],
+    },
+}
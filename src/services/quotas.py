@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from services.sqlite_utils import connect
+from utils.config import (
+    get_api_keys,
+    get_quota_requests_per_minute,
+    get_quota_actor_runs_per_hour,
+    get_quota_llm_tokens_per_hour,
+    get_usage_flush_interval,
+    get_usage_path,
+)
+
+USAGE_KINDS = ("requests", "actor_runs", "llm_tokens", "rejected")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS api_usage (
+        key_name TEXT NOT NULL,
+        day TEXT NOT NULL,
+        requests INTEGER NOT NULL DEFAULT 0,
+        actor_runs INTEGER NOT NULL DEFAULT 0,
+        llm_tokens INTEGER NOT NULL DEFAULT 0,
+        rejected INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (key_name, day)
+    )
+"""
+
+# Usage of the API key behind the current request; set by the quota middleware
+current_usage: ContextVar[Optional["KeyUsage"]] = ContextVar("current_usage", default=None)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate tokens/second up to capacity"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, period_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / period_seconds
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float = 1) -> bool:
+        """Take amount tokens if available"""
+        self._refill()
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def spend(self, amount: float) -> None:
+        """Take amount tokens even if that leaves the bucket in debt (cost known only afterwards)"""
+        self._refill()
+        self.tokens -= amount
+
+    def available(self, amount: float = 1) -> bool:
+        self._refill()
+        return self.tokens >= amount
+
+    def retry_after(self, amount: float = 1) -> int:
+        """Seconds until amount tokens are available"""
+        self._refill()
+        return max(1, int((amount - self.tokens) / self.rate + 0.999))
+
+    def snapshot(self) -> Dict[str, float]:
+        self._refill()
+        return {"remaining": round(max(self.tokens, 0), 2), "capacity": self.capacity,
+                "refill_per_second": round(self.rate, 4)}
+
+
+class KeyUsage:
+    """Buckets and not-yet-flushed counters of one API key"""
+
+    __slots__ = ("name", "buckets", "pending")
+
+    def __init__(self, name: str, requests_per_minute: int, actor_runs_per_hour: int, llm_tokens_per_hour: int):
+        self.name = name
+        self.buckets = {
+            "requests": TokenBucket(requests_per_minute, 60),
+            "actor_runs": TokenBucket(actor_runs_per_hour, 3600),
+            "llm_tokens": TokenBucket(llm_tokens_per_hour, 3600),
+        }
+        self.pending = dict.fromkeys(USAGE_KINDS, 0)
+
+    def charge(self, kind: str, amount: int = 1) -> None:
+        if amount <= 0:
+            return
+        self.buckets[kind].spend(amount)
+        self.pending[kind] += amount
+
+
+def charge_usage(kind: str, amount: int = 1) -> None:
+    """
+    Charge spend (actor_runs, llm_tokens) to the API key of the current request.
+    A no-op outside a keyed request (open API, background jobs).
+    """
+    usage = current_usage.get()
+    if usage is not None:
+        usage.charge(kind, amount)
+
+
+class QuotaManager:
+    """
+    Per-API-key token buckets for requests, actor runs and LLM tokens.
+    Checks and counting are in-memory dict/bucket updates; counters are written
+    to SQLite in one batched transaction every USAGE_FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_usage_path()
+        self.keys = get_api_keys()
+        self.enabled = bool(self.keys)
+        self.flush_interval = get_usage_flush_interval()
+        limits = (get_quota_requests_per_minute(), get_quota_actor_runs_per_hour(), get_quota_llm_tokens_per_hour())
+        self.usage: Dict[str, KeyUsage] = {key: KeyUsage(name, *limits) for key, name in self.keys.items()}
+        self.by_name: Dict[str, KeyUsage] = {usage.name: usage for usage in self.usage.values()}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(SCHEMA)
+        return self._conn
+
+    def lookup(self, api_key: Optional[str]) -> Optional[KeyUsage]:
+        return self.usage.get(api_key) if api_key else None
+
+    def lookup_name(self, name: Optional[str]) -> Optional[KeyUsage]:
+        """Usage of the key with this name (what subscriptions record as their owner)"""
+        return self.by_name.get(name) if name else None
+
+    def collect(self) -> List[tuple]:
+        """Take the pending counters of every key as usage rows (call on the event loop thread)"""
+        day = datetime.now(timezone.utc).date().isoformat()
+        rows = []
+        for usage in self.usage.values():
+            pending = usage.pending
+            if not any(pending.values()):
+                continue
+            # Swap before writing so counts made meanwhile land in the next flush
+            usage.pending = dict.fromkeys(USAGE_KINDS, 0)
+            rows.append((usage.name, day, *(pending[kind] for kind in USAGE_KINDS)))
+        return rows
+
+    def write(self, rows: List[tuple]) -> None:
+        """Add usage rows to the stored per-day totals in one transaction"""
+        if not rows:
+            return
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO api_usage (key_name, day, requests, actor_runs, llm_tokens, rejected) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key_name, day) DO UPDATE SET "
+                    "requests = requests + excluded.requests, actor_runs = actor_runs + excluded.actor_runs, "
+                    "llm_tokens = llm_tokens + excluded.llm_tokens, rejected = rejected + excluded.rejected",
+                    rows
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def flush(self) -> int:
+        """Write and reset pending counters of every key; returns rows written"""
+        rows = self.collect()
+        self.write(rows)
+        return len(rows)
+
+    async def run_flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.write, self.collect())
+            except Exception as e:
+                print(f"Error flushing usage counters: {e}")
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run_flusher())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.enabled:
+            self.flush()
+
+    def _usage_rows(self, name: str, days: int) -> List[tuple]:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT day, requests, actor_runs, llm_tokens, rejected FROM api_usage "
+                "WHERE key_name = ? ORDER BY day DESC LIMIT ?",
+                (name, days)
+            ).fetchall()
+
+    async def report(self, usage: KeyUsage, days: int = 7) -> Dict[str, Any]:
+        """Remaining quota and recorded usage (per day, newest first) of one key"""
+        # The query runs in a thread; counters and buckets are only touched on the event loop
+        rows = await asyncio.to_thread(self._usage_rows, usage.name, days)
+        daily: List[Dict[str, Any]] = [dict(zip(("day",) + USAGE_KINDS, row)) for row in rows]
+        today = datetime.now(timezone.utc).date().isoformat()
+        if not daily or daily[0]["day"] != today:
+            daily.insert(0, {"day": today, **dict.fromkeys(USAGE_KINDS, 0)})
+        # Not flushed yet, but already spent
+        for kind in USAGE_KINDS:
+            daily[0][kind] += usage.pending[kind]
+        return {
+            "key": usage.name,
+            "quotas": {kind: bucket.snapshot() for kind, bucket in usage.buckets.items()},
+            "usage": daily[:days],
+        }
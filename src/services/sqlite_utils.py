@@ -0,0 +1,16 @@
+import os
+import sqlite3
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open a SQLite connection set up for many readers and one writer across
+    worker processes (WAL journal, autocommit, shared between threads behind a lock).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
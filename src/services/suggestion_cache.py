@@ -0,0 +1,189 @@
+import asyncio
+import random
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from services.cache import create_cache
+from utils.config import get_suggestion_cache_ttl, get_starter_pool_size
+
+STARTER_POOL_PROMPT = """
+Generate {size} varied conversation starters in {language} language for someone interested in {interest}.
+
+Preferred Tone: {tone}
+
+Spread them across these categories: {categories}
+
+Generate conversation starters that are:
+1. Natural and engaging
+2. About {interest}, without assuming anything else about the person
+3. Appropriate for {language} culture
+4. In {tone} tone
+
+Return ONLY a JSON array with this format:
+[
+  {{
+    "id": "starter-1",
+    "category": "one of the categories above",
+    "tone": "{tone}",
+    "text": "Your conversation starter text here",
+    "context": "Context about when to use this starter",
+    "cultural_notes": "Any cultural considerations"
+  }}
+]
+"""
+
+POOL_CATEGORIES = ["general", "interests", "experiences", "fun", "deep"]
+
+
+def _names(items: List[Any], key: str) -> List[str]:
+    """Analysis results carry dicts ({"name": ...}); older callers send plain strings"""
+    names = []
+    for item in items:
+        if isinstance(item, dict):
+            item = item.get(key) or item.get('name') or ''
+        item = str(item).strip()
+        if item:
+            names.append(item)
+    return names
+
+
+def normalize_starter_inputs(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Pull the inputs that shape a starters prompt out of a request body"""
+    profile_analysis = request.get('profile_analysis', {}) or {}
+    communication_style = profile_analysis.get('communication_style', 'casual')
+    if isinstance(communication_style, dict):
+        communication_style = communication_style.get('tone', 'casual')
+    return {
+        "interests": _names(profile_analysis.get('interests', []), 'name')[:3],
+        "personality_traits": _names(profile_analysis.get('personality_traits', []), 'trait')[:2],
+        "communication_style": str(communication_style),
+        "language": str(request.get('language', 'en')).lower(),
+        "category": request.get('category'),
+        "tone": str(request.get('tone', 'casual')).lower(),
+        "count": int(request.get('count', 8)),
+    }
+
+
+def starters_cache_key(inputs: Dict[str, Any]) -> Tuple:
+    return (
+        tuple(sorted(i.lower() for i in inputs["interests"])),
+        tuple(sorted(t.lower() for t in inputs["personality_traits"])),
+        inputs["communication_style"].lower(),
+        inputs["language"],
+        (inputs["category"] or '').lower(),
+        inputs["tone"],
+        inputs["count"],
+    )
+
+
+def suggestions_cache_key(message: str, context: str, language: str, styles: List[str]) -> Tuple:
+    return (
+        ' '.join(message.lower().split()),
+        ' '.join(context.lower().split()),
+        language.lower(),
+        tuple(s.lower() for s in styles),
+    )
+
+
+class StarterPool:
+    """
+    Precomputed conversation starters per (interest, language, tone).
+    Pools are filled in the background the first time a combination is seen,
+    after which matching requests are served without an LLM call. Requests the
+    pools can't cover (too few distinct starters) take the per-request prompt.
+    """
+
+    def __init__(self, generate_json: Callable[..., Awaitable[Any]], pool_size: Optional[int] = None):
+        self.generate_json = generate_json
+        self.pool_size = pool_size or get_starter_pool_size()
+        self.pool_ttl = get_suggestion_cache_ttl() * 4
+        self._pools = create_cache("starter_pools", max_size=4096, ttl_seconds=self.pool_ttl)
+        self._pending: Dict[Tuple[str, str, str], asyncio.Task] = {}
+
+    @staticmethod
+    def _key(interest: str, language: str, tone: str) -> Tuple[str, str, str]:
+        return (interest.lower(), language.lower(), tone.lower())
+
+    async def sample(self, interests: List[str], language: str, tone: str,
+               category: Optional[str], count: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rank and sample starters from the pools of the given interests.
+        Returns None when the pools can't cover the request yet.
+        """
+        if not interests:
+            return None
+        candidates = []
+        for rank, interest in enumerate(interests):
+            pool = await self._pools.aget(self._key(interest, language, tone))
+            if not pool:
+                continue
+            for starter in pool:
+                category_match = bool(category) and (starter.get('category') or '').lower() == category.lower()
+                # Category match first, then the person's stronger interests; random breaks ties for variety
+                candidates.append(((not category_match, rank, random.random()), starter))
+        if len(candidates) < count:
+            return None
+
+        candidates.sort(key=lambda c: c[0])
+        starters = []
+        seen = set()
+        for _, starter in candidates:
+            text = starter.get('text')
+            if not isinstance(text, str):
+                continue
+            text = text.strip().lower()
+            if not text or text in seen:
+                continue
+            seen.add(text)
+            starters.append({
+                **starter,
+                "id": f"starter-{len(starters) + 1}",
+                "category": starter.get('category') or category or 'general',
+                "tone": tone,
+            })
+            if len(starters) == count:
+                return starters
+        return None
+
+    def covers(self, interests: List[str], count: int) -> bool:
+        """Whether full pools of these interests could hold count starters"""
+        return bool(interests) and count <= self.pool_size * len(interests)
+
+    async def ensure_pools(self, interests: List[str], language: str, tone: str) -> None:
+        """Schedule background generation for any missing pools"""
+        for interest in interests:
+            key = self._key(interest, language, tone)
+            if key in self._pending or await self._pools.aget(key) is not None:
+                continue
+            self._pending[key] = asyncio.ensure_future(self._fill(key, interest, language, tone))
+
+    async def _fill(self, key: Tuple[str, str, str], interest: str, language: str, tone: str) -> None:
+        try:
+            prompt = STARTER_POOL_PROMPT.format(
+                size=self.pool_size,
+                language=language,
+                interest=interest,
+                tone=tone,
+                categories=', '.join(POOL_CATEGORIES)
+            )
+            starters = await self.generate_json(prompt)
+            if isinstance(starters, list):
+                pool = [
+                    s for s in starters
+                    if isinstance(s, dict) and isinstance(s.get('text'), str) and s['text'].strip()
+                ]
+                if pool:
+                    await self._pools.aset(key, pool)
+                    print(f"Starter pool ready for {key}: {len(pool)} starters")
+        except Exception as e:
+            print(f"Error generating starter pool for {key}: {e}")
+        finally:
+            self._pending.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pools": len(self._pools), "pending": len(self._pending)}
+
+    def cancel_pending(self) -> List[asyncio.Task]:
+        """Cancel in-flight pool generation (app shutdown); returns the cancelled tasks"""
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        return tasks
@@ -0,0 +1,511 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import urlsplit
+from typing import Dict, Any, List, Optional, Tuple
+from services.sqlite_utils import connect
+from utils.config import get_store_path, get_webhook_max_attempts, get_webhook_timeout, get_webhook_allowed_hosts
+
+# Kept in the profile store's database file
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS webhook_subscriptions (
+        id TEXT PRIMARY KEY,
+        callback_url TEXT NOT NULL,
+        secret TEXT,
+        created_at REAL NOT NULL,
+        owner TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS subscription_usernames (
+        subscription_id TEXT NOT NULL,
+        username TEXT NOT NULL,
+        PRIMARY KEY (subscription_id, username)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_subscription_usernames_username ON subscription_usernames (username)",
+    """
+    CREATE TABLE IF NOT EXISTS watched_profiles (
+        username TEXT PRIMARY KEY,
+        check_interval REAL NOT NULL,
+        next_check_at REAL NOT NULL,
+        last_checked_at REAL,
+        last_changed_at REAL,
+        followers_count INTEGER,
+        following_count INTEGER,
+        posts_count INTEGER,
+        short_codes TEXT,
+        newest_post_at REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_watched_profiles_next_check_at ON watched_profiles (next_check_at)",
+    """
+    CREATE TABLE IF NOT EXISTS webhook_deliveries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subscription_id TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_due ON webhook_deliveries (status, next_attempt_at)",
+]
+
+# Columns added after the first release, created on older databases at startup
+MIGRATIONS = {
+    "webhook_subscriptions": [
+        ("owner", "TEXT"),
+    ],
+    "watched_profiles": [
+        ("followers_count", "INTEGER"),
+        ("following_count", "INTEGER"),
+        ("posts_count", "INTEGER"),
+        ("short_codes", "TEXT"),
+        ("newest_post_at", "REAL"),
+    ],
+}
+
+# Retry n waits RETRY_BASE_DELAY * 2^(n-1) seconds
+RETRY_BASE_DELAY = 30
+
+
+def sign_payload(secret: str, body: bytes) -> str:
+    """HMAC-SHA256 signature sent in X-Webhook-Signature so receivers can verify the sender"""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+async def check_callback_url(url: str) -> Optional[str]:
+    """
+    Raise ValueError unless url is http(s) and its host resolves only to public
+    addresses, so callbacks can't be pointed at loopback, the cloud metadata
+    endpoint or the internal network. Hosts in WEBHOOK_ALLOWED_HOSTS are exempt.
+    Returns the vetted address to connect to (None for exempt hosts).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if host in get_webhook_allowed_hosts():
+        return None
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port or (443 if parts.scheme == "https" else 80))
+    except OSError as e:
+        raise ValueError(f"callback_url host {host} does not resolve: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        mapped = getattr(address, "ipv4_mapped", None)
+        if not (mapped or address).is_global:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address ({address})")
+    return infos[0][4][0].split("%", 1)[0]
+
+
+class SubscriptionStore:
+    """
+    Webhook subscriptions, the refresh schedule of every subscribed profile and
+    an outbox of webhook deliveries. Work is claimed with short leases so several
+    worker processes can run the watcher without doing anything twice.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_store_path()
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        with self._lock:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            self._migrate()
+
+    def _migrate(self) -> None:
+        for table, columns in MIGRATIONS.items():
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns:
+                if column in existing:
+                    continue
+                try:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError as e:
+                    # Another worker added it first
+                    if "duplicate column" not in str(e):
+                        raise
+
+    def _subscription(self, row, usernames: List[str]) -> Dict[str, Any]:
+        return {
+            "id": row[0],
+            "callback_url": row[1],
+            "has_secret": bool(row[2]),
+            "created_at": datetime.fromtimestamp(row[3]).isoformat(),
+            "usernames": sorted(usernames),
+        }
+
+    def create(self, usernames: List[str], callback_url: str, secret: Optional[str] = None,
+               first_check_at: Optional[float] = None, owner: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Subscribe callback_url to changes of usernames; new profiles are checked on the next tick.
+        owner is the API key name the subscription belongs to (None on an open API).
+        """
+        now = time.time()
+        subscription_id = uuid.uuid4().hex
+        names = sorted({u.lower() for u in usernames})
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO webhook_subscriptions (id, callback_url, secret, created_at, owner) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (subscription_id, callback_url, secret, now, owner)
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO subscription_usernames VALUES (?, ?)",
+                    [(subscription_id, name) for name in names]
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO watched_profiles (username, check_interval, next_check_at) VALUES (?, 0, ?)",
+                    [(name, first_check_at if first_check_at is not None else now) for name in names]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._subscription((subscription_id, callback_url, secret, now), names)
+
+    def get(self, subscription_id: str, owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The subscription, if it exists and belongs to owner (any owner when None)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, callback_url, secret, created_at FROM webhook_subscriptions "
+                "WHERE id = ? AND (? IS NULL OR owner = ?)",
+                (subscription_id, owner, owner)
+            ).fetchone()
+            if row is None:
+                return None
+            usernames = self._conn.execute(
+                "SELECT username FROM subscription_usernames WHERE subscription_id = ?", (subscription_id,)
+            ).fetchall()
+        return self._subscription(row, [u[0] for u in usernames])
+
+    def list(self, limit: int = 50, offset: int = 0, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, callback_url, secret, created_at FROM webhook_subscriptions "
+                "WHERE ? IS NULL OR owner = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (owner, owner, limit, offset)
+            ).fetchall()
+            usernames: Dict[str, List[str]] = {row[0]: [] for row in rows}
+            if rows:
+                for subscription_id, username in self._conn.execute(
+                    f"SELECT subscription_id, username FROM subscription_usernames "
+                    f"WHERE subscription_id IN ({', '.join('?' * len(rows))})",
+                    [row[0] for row in rows]
+                ):
+                    usernames[subscription_id].append(username)
+        return [self._subscription(row, usernames[row[0]]) for row in rows]
+
+    def delete(self, subscription_id: str, owner: Optional[str] = None) -> bool:
+        """Remove owner's subscription; profiles nobody else subscribes to stop being watched"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._conn.execute(
+                    "DELETE FROM webhook_subscriptions WHERE id = ? AND (? IS NULL OR owner = ?)",
+                    (subscription_id, owner, owner)
+                ).rowcount
+                if not deleted:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute("DELETE FROM subscription_usernames WHERE subscription_id = ?", (subscription_id,))
+                self._conn.execute(
+                    "DELETE FROM watched_profiles WHERE username NOT IN (SELECT username FROM subscription_usernames)"
+                )
+                self._conn.execute(
+                    "DELETE FROM webhook_deliveries WHERE subscription_id = ? AND status = 'pending'", (subscription_id,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return deleted > 0
+
+    def claim_due_profiles(self, limit: int, lease_seconds: float) -> List[Tuple[str, float]]:
+        """
+        Take up to limit profiles whose refresh is due, as (username, current interval).
+        Their next check is pushed back by lease_seconds so other workers skip them.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT username, check_interval FROM watched_profiles WHERE next_check_at <= ? "
+                    "ORDER BY next_check_at LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE watched_profiles SET next_check_at = ? WHERE username = ?",
+                    [(now + lease_seconds, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def reschedule(self, schedule: List[Tuple[str, float, bool]]) -> None:
+        """Record a check of each (username, next interval, changed) and schedule the next one"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE watched_profiles SET check_interval = ?, next_check_at = ?, last_checked_at = ?, "
+                "last_changed_at = CASE WHEN ? THEN ? ELSE last_changed_at END WHERE username = ?",
+                [(interval, now + interval, now, changed, now, username) for username, interval, changed in schedule]
+            )
+
+    def get_snapshots(self, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        What each profile looked like when the watcher last checked it (counts,
+        post shortCodes, newest post time) - profiles never checked are left out
+        """
+        names = [u.lower() for u in usernames]
+        if not names:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT username, followers_count, following_count, posts_count, short_codes, newest_post_at "
+                f"FROM watched_profiles WHERE username IN ({', '.join('?' * len(names))}) AND short_codes IS NOT NULL",
+                names
+            ).fetchall()
+        return {
+            row[0]: {
+                "followersCount": row[1],
+                "followingCount": row[2],
+                "postsCount": row[3],
+                "shortCodes": set(json.loads(row[4])),
+                "newestPostAt": row[5],
+            }
+            for row in rows
+        }
+
+    def save_snapshots(self, snapshots: List[Tuple[str, Optional[int], Optional[int], Optional[int], List[str], Optional[float]]]) -> None:
+        """Store (username, followers, following, posts, shortCodes, newest post time) as the next diff baseline"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE watched_profiles SET followers_count = ?, following_count = ?, posts_count = ?, "
+                "short_codes = ?, newest_post_at = ? WHERE username = ?",
+                [
+                    (followers, following, posts, json.dumps(sorted(short_codes)), newest_post_at, username)
+                    for username, followers, following, posts, short_codes, newest_post_at in snapshots
+                ]
+            )
+
+    def subscribers(self, usernames: List[str]) -> Dict[str, List[str]]:
+        """subscription id -> which of usernames it follows"""
+        names = [u.lower() for u in usernames]
+        if not names:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT subscription_id, username FROM subscription_usernames "
+                f"WHERE username IN ({', '.join('?' * len(names))})",
+                names
+            ).fetchall()
+        followed: Dict[str, List[str]] = {}
+        for subscription_id, username in rows:
+            followed.setdefault(subscription_id, []).append(username)
+        return followed
+
+    def owners(self, usernames: List[str]) -> Dict[str, List[Optional[str]]]:
+        """username -> owners (API key names, None on an open API) of the subscriptions following it"""
+        names = [u.lower() for u in usernames]
+        if not names:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT su.username, ws.owner FROM subscription_usernames su "
+                f"JOIN webhook_subscriptions ws ON ws.id = su.subscription_id "
+                f"WHERE su.username IN ({', '.join('?' * len(names))})",
+                names
+            ).fetchall()
+        owners: Dict[str, List[Optional[str]]] = {}
+        for username, owner in rows:
+            owners.setdefault(username, []).append(owner)
+        return owners
+
+    def count_usernames(self, owner: str, extra: Optional[List[str]] = None) -> int:
+        """Distinct usernames owner watches, counting extra (a new subscription's names) too"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT su.username FROM subscription_usernames su "
+                "JOIN webhook_subscriptions ws ON ws.id = su.subscription_id WHERE ws.owner = ?",
+                (owner,)
+            ).fetchall()
+        return len({row[0] for row in rows} | {u.lower() for u in extra or []})
+
+    def enqueue(self, deliveries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Queue (subscription id, payload) deliveries for the dispatcher"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO webhook_deliveries (subscription_id, payload, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(subscription_id, json.dumps(payload, default=str), now, now) for subscription_id, payload in deliveries]
+            )
+
+    def claim_due_deliveries(self, limit: int, lease_seconds: float) -> List[tuple]:
+        """Take up to limit pending deliveries that are due, with their subscription's URL and secret"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT d.id, d.subscription_id, s.callback_url, s.secret, d.payload, d.attempts "
+                    "FROM webhook_deliveries d JOIN webhook_subscriptions s ON s.id = d.subscription_id "
+                    "WHERE d.status = 'pending' AND d.next_attempt_at <= ? ORDER BY d.next_attempt_at LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE webhook_deliveries SET next_attempt_at = ? WHERE id = ?",
+                    [(now + lease_seconds, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def record_attempts(self, delivered: List[int], failed: List[Tuple[int, int, str, Optional[float]]]) -> None:
+        """
+        Delivered ids are removed from the outbox; failed ones are (id, attempts, error,
+        next attempt time), or marked failed for good when the next attempt time is None
+        """
+        with self._lock:
+            self._conn.executemany("DELETE FROM webhook_deliveries WHERE id = ?", [(i,) for i in delivered])
+            self._conn.executemany(
+                "UPDATE webhook_deliveries SET attempts = ?, last_error = ?, "
+                "status = CASE WHEN ? IS NULL THEN 'failed' ELSE 'pending' END, "
+                "next_attempt_at = COALESCE(?, next_attempt_at) WHERE id = ?",
+                [(attempts, error, retry_at, retry_at, i) for i, attempts, error, retry_at in failed]
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscriptions = self._conn.execute("SELECT COUNT(*) FROM webhook_subscriptions").fetchone()[0]
+            watched = self._conn.execute(
+                "SELECT COUNT(*), MIN(next_check_at), AVG(NULLIF(check_interval, 0)) FROM watched_profiles"
+            ).fetchone()
+            deliveries = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM webhook_deliveries GROUP BY status"
+            ).fetchall())
+        return {
+            "subscriptions": subscriptions,
+            "watched_profiles": watched[0],
+            "next_check_at": datetime.fromtimestamp(watched[1]).isoformat() if watched[1] else None,
+            "average_check_interval": round(watched[2], 1) if watched[2] else None,
+            "pending_deliveries": deliveries.get("pending", 0),
+            "failed_deliveries": deliveries.get("failed", 0),
+        }
+
+
+class WebhookDispatcher:
+    """Sends queued deliveries concurrently, retrying failures with exponential backoff"""
+
+    def __init__(self, subscriptions: SubscriptionStore, batch_size: int = 50):
+        self.subscriptions = subscriptions
+        self.batch_size = batch_size
+        self.max_attempts = get_webhook_max_attempts()
+        self.timeout = get_webhook_timeout()
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+
+            # A redirect would be followed to a host nobody checked, e.g. http://169.254.169.254/
+            self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=False)
+        return self._client
+
+    async def _send(self, delivery_id: int, callback_url: str, secret: Optional[str],
+                    payload: str, attempt: int) -> Optional[str]:
+        """POST one delivery; returns an error message or None on success"""
+        body = payload.encode()
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Delivery": str(delivery_id),
+            "X-Webhook-Attempt": str(attempt),
+        }
+        if secret:
+            headers["X-Webhook-Signature"] = sign_payload(secret, body)
+        try:
+            # Checked again on every attempt: DNS may have changed since the subscription was made
+            address = await check_callback_url(callback_url)
+        except ValueError as e:
+            return f"Blocked: {e}"
+        try:
+            response = await self._post(callback_url, address, body, headers)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        if response.status_code >= 300:
+            return f"HTTP {response.status_code}"
+        return None
+
+    async def _post(self, url: str, address: Optional[str], body: bytes, headers: Dict[str, str]):
+        """
+        POST to url over a connection to the vetted address instead of resolving
+        the host again, so a DNS-rebinding host can't swap in an internal address
+        after the check. Host header and TLS SNI/certificate check keep the real name.
+        """
+        import httpx
+
+        request_url = httpx.URL(url)
+        extensions = {}
+        if address is not None:
+            headers = {**headers, "Host": request_url.netloc.decode("ascii")}
+            if request_url.scheme == "https":
+                extensions["sni_hostname"] = request_url.host
+            request_url = request_url.copy_with(host=address)
+        request = self.client.build_request("POST", request_url, content=body, headers=headers, extensions=extensions)
+        return await self.client.send(request)
+
+    async def deliver_due(self) -> int:
+        """Send every delivery that is due; returns how many were delivered"""
+        delivered_total = 0
+        while True:
+            rows = await asyncio.to_thread(
+                self.subscriptions.claim_due_deliveries, self.batch_size, self.timeout * 2
+            )
+            if not rows:
+                return delivered_total
+            errors = await asyncio.gather(*[
+                self._send(delivery_id, callback_url, secret, payload, attempts + 1)
+                for delivery_id, _, callback_url, secret, payload, attempts in rows
+            ])
+            delivered = []
+            failed = []
+            now = time.time()
+            for (delivery_id, subscription_id, callback_url, _, _, attempts), error in zip(rows, errors):
+                if error is None:
+                    delivered.append(delivery_id)
+                    continue
+                attempts += 1
+                retry_at = now + RETRY_BASE_DELAY * 2 ** (attempts - 1) if attempts < self.max_attempts else None
+                print(f"Webhook delivery {delivery_id} to {callback_url} failed (attempt {attempts}): {error}")
+                failed.append((delivery_id, attempts, error, retry_at))
+            await asyncio.to_thread(self.subscriptions.record_attempts, delivered, failed)
+            delivered_total += len(delivered)
+            if len(rows) < self.batch_size:
+                return delivered_total
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
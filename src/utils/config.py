@@ -1,4 +1,6 @@
 import os
+import re
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,4 +29,251 @@ def url_to_username(url: str) -> str:
         # Remove any additional path segments
         username = username.split("/")[0]
         return username
-    return url
\ No newline at end of file
+    return url
+
+# Instagram handles: up to 30 letters, digits, periods and underscores
+USERNAME_PATTERN = re.compile(r"^[a-z0-9._]{1,30}$")
+
+# First path segments of instagram.com links that aren't profiles (posts, reels, stories, ...)
+RESERVED_PATH_SEGMENTS = {"p", "reel", "reels", "stories", "explore", "tv"}
+
+def normalize_username(value: str) -> str:
+    """
+    Canonical (lowercase) Instagram username from a name, @name or profile URL;
+    empty if it is not a valid username
+    """
+    username = url_to_username(str(value).strip())
+    username = username.split("?", 1)[0].split("#", 1)[0].strip().lstrip("@").lower()
+    if username in RESERVED_PATH_SEGMENTS or not USERNAME_PATTERN.match(username):
+        return ""
+    return username
+
+def get_prompt_token_budget() -> int:
+    """Get the approximate token budget for a single analysis prompt"""
+    return int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
+
+def get_prompt_caption_max_chars() -> int:
+    """Get the maximum number of characters kept from a single caption"""
+    return int(os.getenv("PROMPT_CAPTION_MAX_CHARS", "400"))
+
+def get_gemini_model_name() -> str:
+    """Get the Gemini model used for analysis and generation"""
+    return os.getenv("GEMINI_MODEL", "gemini-pro")
+
+def get_gemini_structured_output(model_name: str = None) -> bool:
+    """
+    Whether to request JSON output via response MIME type / schema.
+    "auto" enables it for models that support it (gemini-1.5 and newer).
+    """
+    value = os.getenv("GEMINI_STRUCTURED_OUTPUT", "auto").lower()
+    if value == "auto":
+        return (model_name or get_gemini_model_name()) not in ("gemini-pro", "gemini-1.0-pro")
+    return value in ("1", "true", "yes", "on")
+
+def get_batch_token_budget() -> int:
+    """Get the approximate token budget for one multi-profile analysis prompt"""
+    return int(os.getenv("BATCH_PROMPT_TOKEN_BUDGET", "8000"))
+
+def get_batch_max_profiles() -> int:
+    """Get the maximum number of profiles packed into one analysis request"""
+    return int(os.getenv("BATCH_MAX_PROFILES", "6"))
+
+def get_batch_max_concurrency() -> int:
+    """Get how many multi-profile analysis requests run at once for one batch"""
+    return max(1, int(os.getenv("BATCH_MAX_CONCURRENCY", "3")))
+
+def get_analyze_max_usernames() -> int:
+    """Get the most usernames one /analyze-profiles request may ask for"""
+    return int(os.getenv("ANALYZE_MAX_USERNAMES", "50"))
+
+def get_batch_caption_token_budget() -> int:
+    """Get the caption token budget for each profile summary in a batch prompt"""
+    return int(os.getenv("BATCH_CAPTION_TOKEN_BUDGET", "250"))
+
+def get_suggestion_cache_ttl() -> int:
+    """Get how long generated starters/suggestions are cached, in seconds"""
+    return int(os.getenv("SUGGESTION_CACHE_TTL", "21600"))
+
+def get_starter_pool_enabled() -> bool:
+    """Whether conversation starters are served from precomputed per-interest pools"""
+    return os.getenv("STARTER_POOL_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+
+def get_starter_pool_size() -> int:
+    """Get the number of starters generated for each (interest, language, tone) pool"""
+    return int(os.getenv("STARTER_POOL_SIZE", "12"))
+
+def get_analysis_mode() -> str:
+    """
+    Get the profile analysis tier: "gemini" (LLM, local heuristics as fallback)
+    or "fast" (local heuristics only, no LLM call)
+    """
+    return os.getenv("ANALYSIS_MODE", "gemini").lower()
+
+def get_preload_services() -> bool:
+    """Whether to build service clients during startup instead of on first request"""
+    return os.getenv("PRELOAD_SERVICES", "false").lower() in ("1", "true", "yes", "on")
+
+def get_server_host() -> str:
+    """Get the interface the production server binds to"""
+    return os.getenv("HOST", "0.0.0.0")
+
+def get_server_port(default: int = 8000) -> int:
+    """Get the port the production server listens on"""
+    return int(os.getenv("PORT", str(default)))
+
+def get_server_workers() -> int:
+    """Get the number of worker processes for the production server"""
+    return int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+def get_graceful_shutdown_timeout() -> int:
+    """Get how long shutdown waits for in-flight requests and actor runs, in seconds"""
+    return int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "60"))
+
+def get_cache_backend() -> str:
+    """
+    Get the cache backend: "memory" (per process) or "sqlite"
+    (a local file shared by every worker process)
+    """
+    return os.getenv("CACHE_BACKEND", "memory").lower()
+
+def get_cache_path() -> str:
+    """Get the SQLite file used by the shared cache backend"""
+    return os.getenv("CACHE_PATH", os.path.join(tempfile.gettempdir(), "ig_scraper_cache.sqlite3"))
+
+def get_scrape_cache_ttl() -> int:
+    """Get how long scraped profiles are reused before re-running the actor, in seconds"""
+    return int(os.getenv("SCRAPE_CACHE_TTL", "900"))
+
+def get_store_enabled() -> bool:
+    """Whether scraped profiles and posts are persisted to the local store"""
+    return os.getenv("PROFILE_STORE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+
+def get_data_dir() -> str:
+    """Get the directory for data that must survive restarts (mount it as a volume in containers)"""
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.getenv("DATA_DIR", os.path.join(project_root, "data"))
+
+def get_store_path() -> str:
+    """Get the SQLite file that persists scraped profiles and posts"""
+    return os.getenv("PROFILE_STORE_PATH", os.path.join(get_data_dir(), "ig_profiles.sqlite3"))
+
+def get_watcher_enabled() -> bool:
+    """Whether the background watcher refreshes subscribed profiles and sends webhooks"""
+    return os.getenv("WATCHER_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+
+def get_watch_tick_interval() -> int:
+    """Get how often the watcher looks for profiles due a refresh, in seconds"""
+    return int(os.getenv("WATCH_TICK_INTERVAL", "30"))
+
+def get_watch_min_interval() -> int:
+    """Get the shortest time between two refreshes of a watched profile, in seconds"""
+    return int(os.getenv("WATCH_MIN_INTERVAL", "900"))
+
+def get_watch_max_interval() -> int:
+    """Get the longest time between two refreshes of a watched profile, in seconds"""
+    return int(os.getenv("WATCH_MAX_INTERVAL", "86400"))
+
+def get_watch_batch_size() -> int:
+    """Get the number of due profiles refreshed together in one actor run"""
+    return int(os.getenv("WATCH_BATCH_SIZE", "10"))
+
+def get_watch_follower_threshold() -> int:
+    """Get the smallest follower change that triggers a notification"""
+    return int(os.getenv("WATCH_FOLLOWER_THRESHOLD", "1"))
+
+def get_subscription_max_usernames() -> int:
+    """Get the most usernames one webhook subscription may watch"""
+    return int(os.getenv("SUBSCRIPTION_MAX_USERNAMES", "50"))
+
+def get_subscription_max_usernames_per_key() -> int:
+    """Get the most distinct usernames one API key may watch across its subscriptions"""
+    return int(os.getenv("SUBSCRIPTION_MAX_USERNAMES_PER_KEY", "200"))
+
+def get_webhook_max_attempts() -> int:
+    """Get how many times a webhook delivery is attempted before it is marked failed"""
+    return int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "6"))
+
+def get_webhook_timeout() -> float:
+    """Get the timeout for a single webhook request, in seconds"""
+    return float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+
+def get_webhook_allowed_hosts() -> set:
+    """
+    Get callback hosts allowed even though they resolve to private, loopback or
+    link-local addresses (WEBHOOK_ALLOWED_HOSTS="localhost,hooks.internal")
+    """
+    return {host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+def get_api_keys() -> dict:
+    """
+    Get the accepted API keys from API_KEYS ("key1:name1,key2:name2"; the name is optional).
+    Empty means the API is open and no quotas are enforced.
+    """
+    keys = {}
+    for entry in os.getenv("API_KEYS", "").split(","):
+        key, _, name = entry.strip().partition(":")
+        if key:
+            keys[key] = name or key[:6]
+    return keys
+
+def get_quota_requests_per_minute() -> int:
+    """Get the number of API requests each key may make per minute (per worker process)"""
+    return int(os.getenv("QUOTA_REQUESTS_PER_MINUTE", "120"))
+
+def get_quota_actor_runs_per_hour() -> int:
+    """Get the number of Apify actor runs each key may trigger per hour (per worker process)"""
+    return int(os.getenv("QUOTA_ACTOR_RUNS_PER_HOUR", "60"))
+
+def get_quota_llm_tokens_per_hour() -> int:
+    """Get the number of Gemini tokens each key may spend per hour (per worker process)"""
+    return int(os.getenv("QUOTA_LLM_TOKENS_PER_HOUR", "200000"))
+
+def get_usage_flush_interval() -> int:
+    """Get how often in-memory usage counters are written to the usage table, in seconds"""
+    return int(os.getenv("USAGE_FLUSH_INTERVAL", "10"))
+
+def get_usage_path() -> str:
+    """Get the SQLite file that stores per-key usage"""
+    return os.getenv("USAGE_PATH", os.path.join(get_data_dir(), "ig_usage.sqlite3"))
+
+def get_admin_api_key() -> str:
+    """Get the key for the admin (profiling) endpoints; empty disables them"""
+    return os.getenv("ADMIN_API_KEY", "")
+
+def get_profiler_max_seconds() -> int:
+    """Get the longest CPU profile the admin endpoint will record, in seconds"""
+    return int(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+def get_llm_providers() -> list:
+    """
+    Get the LLM providers as (kind, model) pairs from LLM_PROVIDERS
+    ("gemini:gemini-1.5-flash,gemini:gemini-1.5-pro"; "fake:200" is a local
+    stand-in answering in ~200ms). The first one is the primary.
+    Defaults to GEMINI_MODEL alone.
+    """
+    providers = []
+    for entry in os.getenv("LLM_PROVIDERS", "").split(","):
+        kind, _, model = entry.strip().partition(":")
+        if kind:
+            providers.append((kind.lower(), model))
+    return providers or [("gemini", get_gemini_model_name())]
+
+def get_llm_race() -> bool:
+    """Whether to send every LLM request to all providers at once and keep the first valid answer"""
+    return os.getenv("LLM_RACE", "false").lower() in ("1", "true", "yes", "on")
+
+def get_llm_max_requests() -> int:
+    """Get the most requests (original plus hedges/failovers) sent for one LLM call"""
+    return max(1, int(os.getenv("LLM_MAX_REQUESTS", "2")))
+
+def get_llm_hedge_percentile() -> float:
+    """Get the primary model's latency percentile after which a hedged request is sent; 0 disables hedging"""
+    return float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+
+def get_llm_hedge_default_delay() -> float:
+    """Get the hedge delay used until enough latencies have been seen, in seconds"""
+    return float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "4"))
+
+def get_llm_hedge_min_delay() -> float:
+    """Get the shortest hedge delay, in seconds"""
+    return float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.25"))